@@ -12,6 +12,7 @@ from . import (
 
 # Quick access for classes and functions
 from .utils.random_state import AL_random as random
+from .utils.cursor import Cursor
 from .package_info import (
     github,)
 from .lattice.lattice import (
@@ -19,8 +20,17 @@ from .lattice.lattice import (
     Poset,
     Relation,
 )
+from .lattice.poset_index import PosetIndex
+from .lattice.storage import LatticeFile, LatticeRecord, LatticeWriter
 from .lattice_iteration import (
-    iter_all_lattices,)
+    count_all_lattices,
+    iter_all_lattices,
+    iter_all_lattices_by_level,
+    iter_all_lattices_parallel,
+    iter_all_posets,
+    iter_distributive_lattices,
+    iter_modular_lattices,
+)
 from .random_lattice.random_lattice import (
     random_lattice,
     random_poset,
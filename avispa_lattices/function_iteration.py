@@ -1,13 +1,17 @@
 from __future__ import annotations
 from functools import reduce
-from typing import TYPE_CHECKING, Any, Generator, Iterable, Iterator, Optional, Tuple, Union, cast, List, Sequence
+import heapq
+from typing import TYPE_CHECKING, Any, Callable, Dict, FrozenSet, Generator, Iterable, Iterator, Optional, Tuple, Union, cast, List, NamedTuple, Sequence
 from typing_extensions import Literal, get_args as literal_args
 
 from .utils._function_types import PartialEndomorphism, Endomorphism, partial_endomorphism
 from .utils.iterators import product_list
+from .utils.cursor import Cursor
+import numpy as np
 from itertools import islice
 from .utils import _enum as AL_enum
 from .lattice.validation import ValidationError
+from .lattice import graph, refinement
 
 if TYPE_CHECKING:
     from .lattice.lattice import Poset as _Poset, Lattice as _Lattice
@@ -29,6 +33,47 @@ def post(iterator: Iterable[Endomorphism],
         yield from (f.copy() for f in iterator)
 
 
+def _backtrack(first: int, last: int, options: Callable[[int], Sequence[int]],
+               assign: Callable[[int, int], bool], name: str,
+               signature: Tuple[Any, ...],
+               cursor: Optional[Cursor] = None) -> Iterator[None]:
+    '''
+    Generic backtracking over the levels i in range(first, last):
+        options(i) lists the candidates for level i given the levels < i,
+        assign(i, k) sets level i to k and tells if it can be extended.
+    Yields None every time all levels are assigned.
+
+    If a cursor is given, its state holds the index in options(i) of the
+    choice made at each level i for the last item yielded, and if the
+    cursor already had a state, the enumeration resumes right after it.
+    '''
+    path = [0] * last
+    done = False
+    resume = None
+    if cursor is not None:
+        snapshot = lambda: {'path': path.copy(), 'done': done}
+        resume = cursor.attach(name, Cursor.signature(*signature), snapshot)
+        if resume is not None:
+            if resume['done']:
+                return
+            resume = resume['path']
+
+    def rec(i, resuming: bool) -> Iterator[None]:
+        if i == last:
+            if not resuming:  # else it was yielded before interruption
+                yield
+            return
+        opts = options(i)
+        start = resume[i] if resuming else 0
+        for idx in range(start, len(opts)):
+            path[i] = idx
+            if assign(i, opts[idx]):
+                yield from rec(i + 1, resuming and idx == start)
+
+    yield from rec(first, resume is not None)
+    done = True
+
+
 def count_f_all(P: _Poset):
     return P.n**P.n
 
@@ -61,7 +106,7 @@ def f_is_monotone(P: _Poset, f, domain: Optional[Sequence[int]] = None):
     return True
 
 
-def f_iter_monotones_poset(P: _Poset, in_place: bool = False):
+def f_iter_monotones_poset_bruteforce(P: _Poset, in_place: bool = False):
     'all monotone functions'
     for f in f_iter_all_poset(P, in_place):
         if f_is_monotone(P, f):
@@ -69,6 +114,159 @@ def f_iter_monotones_poset(P: _Poset, in_place: bool = False):
     return
 
 
+def f_iter_monotones_poset(P: _Poset, in_place: bool = False,
+                           cursor: Optional[Cursor] = None):
+    '''
+    all monotone functions, by backtracking in toposort order.
+    The candidates for f[x] are the elements above f[c] for every child c
+    of x, i.e. the intersection of the up-sets of the images of children.
+    See help(Cursor) for checkpoint and resume.
+    '''
+    if not in_place:
+        yield from post(f_iter_monotones_poset(P, True, cursor), in_place)
+        return
+    # Shortcuts
+    n = P.n
+    topo = P.toposort_bottom_up
+    children = P.children
+    up_bits = _up_bits(P)
+    f = partial_endomorphism(n)
+
+    def options(i):
+        mask = reduce(lambda m, c: m & up_bits[f[c]], children[topo[i]], -1)
+        return [*_iter_bits(mask, topo)]
+
+    def assign(i, k):
+        f[topo[i]] = k
+        return True
+
+    signature = (P.leq,)
+    it = _backtrack(0, n, options, assign, 'f_iter_monotones_poset',
+                    signature, cursor)
+    yield from (f for _ in it)
+
+
+def count_f_monotones_poset(P: _Poset):
+    '''
+    Number of monotone functions, without enumerating them.
+
+    The domain is split in independent components (the count is the product
+    of the counts over each of them), and each component is traversed with
+    a dynamic programming over the backtracking of f_iter_monotones_poset:
+    the number of ways to complete f[topo[:i]] only depends on the images
+    of the elements of topo[:i] that have some parent in topo[i:].
+    '''
+    n = P.n
+    children = P.children
+    up_bits = _up_bits(P)
+    topo_all = P.toposort_bottom_up
+    full_mask = (1 << n) - 1
+
+    def count_component(domain: List[int]):
+        m = len(domain)
+        topo = _toposort_narrow(P, domain)
+        frontier = _frontiers(P, topo)
+        f = partial_endomorphism(n)
+        memo = [{} for _ in range(m + 1)]
+
+        def count(i) -> int:
+            if i == m:
+                return 1
+            key = tuple(f[x] for x in frontier[i])
+            if key not in memo[i]:
+                x = topo[i]
+                mask = reduce(lambda bits, c: bits & up_bits[f[c]],
+                              children[x], full_mask)
+                if i == m - 1:
+                    total = bin(mask).count('1')
+                else:
+                    total = 0
+                    for k in _iter_bits(mask, topo_all):
+                        f[x] = k
+                        total += count(i + 1)
+                memo[i][key] = total
+            return memo[i][key]
+
+        return count(0)
+
+    components = graph.independent_components(P)
+    return reduce(lambda a, b: a * b, map(count_component, components), 1)
+
+
+def _toposort_narrow(P: _Poset, domain: Sequence[int]) -> List[int]:
+    '''
+    toposort of the subposet domain that greedily keeps small the number
+    of visited elements having some non-visited parent.
+    '''
+    children = P.children
+    parents = P.parents
+    rank = P.toporank
+    pending = {x: len(parents[x]) for x in domain}
+    indeg = {x: len(children[x]) for x in domain}
+    available = {x for x in domain if indeg[x] == 0}
+    topo: List[int] = []
+    while available:
+        # Prefer elements that close many frontier elements and open few
+        key = lambda x: (
+            -sum(pending[c] == 1 for c in children[x]),
+            len(parents[x]) > 0,
+            rank[x],
+        )
+        x = min(available, key=key)
+        available.remove(x)
+        topo.append(x)
+        for c in children[x]:
+            pending[c] -= 1
+        for y in parents[x]:
+            indeg[y] -= 1
+            if indeg[y] == 0:
+                available.add(y)
+    return topo
+
+
+def f_iter_monotones_poset_chunks(P: _Poset, chunk_size: int = 1024):
+    '''
+    all monotone functions, in the same order as f_iter_monotones_poset,
+    grouped in numpy arrays of shape (m, n) with m <= chunk_size.
+    '''
+    assert chunk_size > 0, f'Invalid chunk_size: {chunk_size}'
+    chunk = np.zeros((chunk_size, P.n), dtype=int)
+    m = 0
+    for f in f_iter_monotones_poset(P, in_place=True):
+        chunk[m] = f
+        m += 1
+        if m == chunk_size:
+            yield chunk.copy()
+            m = 0
+    if m > 0:
+        yield chunk[:m].copy()
+
+
+def _up_bits(P: _Poset) -> List[int]:
+    'for each i, bitmask of the positions in toposort of elements j >= i'
+    rank = P.toporank
+    leq = P.leq
+    n = P.n
+    return [sum(1 << rank[j] for j in range(n) if leq[i, j]) for i in range(n)]
+
+
+def _iter_bits(mask: int, topo: Sequence[int]) -> Iterator[int]:
+    'elements topo[r] for each bit r set in mask, in increasing order'
+    mask &= (1 << len(topo)) - 1
+    while mask:
+        low = mask & -mask
+        r = low.bit_length() - 1
+        yield topo[r]
+        mask ^= low
+
+
+def _frontiers(P: _Poset, topo: Sequence[int]) -> List[List[int]]:
+    'for each i, elements of topo[:i] that have some parent in topo[i:]'
+    rank = {x: i for i, x in enumerate(topo)}
+    last = {x: max((rank[y] for y in P.parents[x]), default=-1) for x in topo}
+    return [[x for x in topo[:i] if last[x] >= i] for i in range(len(topo) + 1)]
+
+
 # @section: all endomorphisms and bottom-endomorphism of a poset
 
 
@@ -114,39 +312,370 @@ def test_f_iter_all_bottom(L: _Lattice):
 
 
 def f_iter_monotones(L: _Lattice, bottom_to_bottom: bool = False,
-                     in_place: bool = False):
-    'all monotone functions'
+                     in_place: bool = False, cursor: Optional[Cursor] = None):
+    '''
+    all monotone functions.
+    See help(Cursor) for checkpoint and resume.
+    '''
     if not in_place:
-        yield from post(f_iter_monotones(L, bottom_to_bottom, in_place=True),
-                        in_place=False)
+        it = f_iter_monotones(L, bottom_to_bottom, True, cursor)
+        yield from post(it, in_place=False)
+        return
+    if L.n == 0:
+        return
+    search = _monotones_search(L, bottom_to_bottom)
+    signature = (L.leq, bottom_to_bottom)
+    it = _backtrack(search.first, L.n, search.options, search.assign,
+                    'f_iter_monotones', signature, cursor)
+    yield from (search.f for _ in it)
+
+
+def f_iter_monotones_orbits(L: _Lattice, bottom_to_bottom: bool = False,
+                            in_place: bool = False,
+                            cursor: Optional[Cursor] = None):
+    '''
+    pairs (f, orbit_size) with one monotone function f per orbit under the
+    automorphisms of L. See help(_iter_orbits).
+    '''
+    if L.n == 0:
         return
+    search = _monotones_search(L, bottom_to_bottom)
+    signature = (L.leq, bottom_to_bottom)
+    yield from _iter_orbits(L, search, 'f_iter_monotones_orbits', signature,
+                            in_place, cursor)
+
+
+class _Search(NamedTuple):
+    'Arguments of _backtrack for searches that assign f[topo[i]] at level i'
+    first: int
+    topo: List[int]
+    f: PartialEndomorphism
+    options: Callable[[int], Sequence[int]]
+    assign: Callable[[int, int], bool]
+
+
+def _monotones_search(L: _Lattice, bottom_to_bottom: bool):
     # Shortcuts
     n = L.n
     leq = L.leq
     topo = L.toposort_bottom_up
     children = L.children
     lub_of_many = L.lub_of_many
-    if n == 0:
-        return
     f = partial_endomorphism(n)
     geq_list = [[j for j in topo if leq[i, j]] for i in range(n)]
 
-    def backtrack(i) -> Iterator[Endomorphism]:
-        'f[topo[j]] is fixed for all j<i. Backtrack f[topo[k]] for all k>=i, k<m'
-        if i == n:
-            yield f
-            return
+    def options(i):
+        'f[topo[j]] is fixed for all j<i'
+        return geq_list[lub_of_many(f[x] for x in children[topo[i]])]
 
-        for k in geq_list[lub_of_many(f[x] for x in children[topo[i]])]:
-            f[topo[i]] = k
-            yield from backtrack(i + 1)
+    def assign(i, k):
+        f[topo[i]] = k
+        return True
 
+    first = 0
     if bottom_to_bottom:
         f[L.bottom] = L.bottom
         assert L.bottom == topo[0]
-        yield from backtrack(1)
-    else:
-        yield from backtrack(0)
+        first = 1
+    return _Search(first, topo, f, options, assign)
+
+
+_Permutation = Tuple[int, ...]
+
+
+def _transversal(generators: Sequence[_Permutation], x: int,
+                 identity: _Permutation) -> Dict[int, _Permutation]:
+    'u[y] for each y in the orbit of x, where u[y] maps x to y'
+    u = {x: identity}
+    queue = [x]
+    for y in queue:
+        for g in generators:
+            z = g[y]
+            if z not in u:
+                u[z] = tuple(g[v] for v in u[y])
+                queue.append(z)
+    return u
+
+
+class _SmallestImage:
+    '''
+    Lexicographic comparison of a (partial) function f with its images
+    s f s^-1 under the automorphisms s of L, without listing them.
+
+    Position by position in topo order, it keeps the images whose prefix
+    equals the prefix of f, as cosets H s where H is the stabilizer of the
+    positions and values fixed so far. The values that H s can give at the
+    next position p are the orbits under the stabilizer of p of the values
+    moved to p, so each coset is split into at most one coset per element
+    of the orbit of p under H. Cosets with the same image are merged with
+    their multiplicities. The stabilizers are the automorphism groups of
+    L with the fixed elements individualized (refinement.canonize).
+    '''
+
+    def __init__(self, L: _Lattice, topo: List[int]):
+        self.leq = L.leq
+        self.topo = topo
+        self.identity = tuple(range(L.n))
+        self._colors = refinement.initial_coloring(L.leq)
+        self._generators: Dict[FrozenSet[int], List[_Permutation]] = {}
+
+    def generators(self, fixed: FrozenSet[int]) -> List[_Permutation]:
+        'generators of the automorphisms of L that fix each element of fixed'
+        if fixed not in self._generators:
+            colors = self._colors
+            for x in sorted(fixed):
+                if (colors == colors[x]).sum() > 1:
+                    colors = refinement.individualize(colors, x)
+            generators = refinement.canonize(self.leq, colors).generators
+            self._generators[fixed] = [tuple(g) for g in generators]
+        return self._generators[fixed]
+
+    def stabilizer(self, f: Sequence[int], length: int) -> Optional[int]:
+        '''
+        None if some automorphism maps f[topo[:length]] to a smaller prefix
+        (comparing until the first unknown value). Otherwise, if length is
+        n, the number of automorphisms s with s f s^-1 == f.
+        '''
+        domain = self.topo[:length]
+        n = len(self.identity)
+
+        def image(s):
+            out = [-1] * n
+            for x in domain:
+                out[s[x]] = s[f[x]]
+            return out
+
+        cosets = {tuple(image(self.identity)): (self.identity, 1)}
+        fixed: FrozenSet[int] = frozenset()
+        for i, p in enumerate(domain):
+            generators = self.generators(fixed)
+            if not generators:  # each coset is a single automorphism
+                return self._compare(f, domain[i:], cosets.values(), image)
+            target = f[p]
+            orbit = _transversal(generators, p, self.identity)
+            stab_p = self.generators(fixed | {p})
+            new_cosets: Dict[Tuple[int, ...], Tuple[_Permutation, int]] = {}
+            for s, mult in cosets.values():
+                g = image(s)
+                for q, u in orbit.items():
+                    if g[q] < 0:
+                        continue  # unknown value at p, not smaller
+                    h = [0] * n  # inverse of u, mapping q to p
+                    for x, y in enumerate(u):
+                        h[y] = x
+                    values = _transversal(stab_p, h[g[q]], self.identity)
+                    m = min(values)
+                    if m < target:
+                        return None
+                    if m > target:
+                        continue
+                    k = values[m]
+                    c = tuple(k[h[s[x]]] for x in range(n))
+                    key = tuple(image(c))
+                    other, count = new_cosets.get(key, (c, 0))
+                    new_cosets[key] = (other, count + mult)
+            cosets = new_cosets
+            fixed = fixed | {p, target}
+        return sum(mult for _, mult in cosets.values())
+
+    @staticmethod
+    def _compare(f, positions, cosets, image) -> Optional[int]:
+        'stabilizer(f, ...) when the remaining cosets are single elements'
+        total = 0
+        for s, mult in cosets:
+            g = image(s)
+            x = next((x for x in positions if g[x] != f[x]), None)
+            if x is None:
+                total += mult
+            elif 0 <= g[x] < f[x]:
+                return None
+        return total
+
+
+def _iter_orbits(L: _Lattice, search: _Search, name: str,
+                 signature: Tuple[Any, ...], in_place: bool = False,
+                 cursor: Optional[Cursor] = None):
+    '''
+    The automorphisms s of L act on functions by f -> s f s^-1. Among the
+    functions found by the search, yields the pairs (f, orbit_size) such
+    that f is the lexicographic leader (the minimum of f[topo[0]],
+    f[topo[1]], ...) of its orbit, whose size is also yielded. Hence the
+    sum of the orbit sizes is the number of functions of the search.
+
+    A partial function f[topo[:i]] is pruned as soon as some automorphism
+    s maps it to a known prefix smaller than f[topo[:i]]. The group is
+    only used through generators of stabilizers (see _SmallestImage), so
+    the cost does not grow with its order.
+    '''
+    n = L.n
+    topo = search.topo
+    order = L.automorphisms.order
+    smallest = _SmallestImage(L, topo)
+    f_arr = [-1] * n
+    for x in topo[:search.first]:
+        f_arr[x] = search.f[x]
+
+    def assign(i, k):
+        if not search.assign(i, k):
+            return False
+        f_arr[topo[i]] = k
+        return order == 1 or smallest.stabilizer(f_arr, i + 1) is not None
+
+    it = _backtrack(search.first, n, search.options, assign, name,
+                    signature, cursor)
+    for _ in it:
+        stabilizer = 1 if order == 1 else smallest.stabilizer(f_arr, n)
+        f = search.f if in_place else search.f.copy()
+        yield f, order // stabilizer
+
+
+class MonotoneRanking:
+    '''
+    Ranking and unranking of the monotone functions of a lattice, in the
+    order of f_iter_monotones, without enumerating them.
+
+    It counts the leaves below each node of the backtracking tree of
+    f_iter_monotones with a dynamic programming: the number of ways to
+    complete f[topo[:i]] only depends on the lower bounds that it imposes
+    on f[y] for the elements y of topo[i:], i.e. on the lub of the images
+    of the children of y that are in topo[:i].
+    '''
+
+    def __init__(self, L: _Lattice, bottom_to_bottom: bool = False):
+        n = L.n
+        self.L = L
+        self.bottom_to_bottom = bottom_to_bottom
+        self.topo = topo = L.toposort_bottom_up
+        rank = L.toporank
+        self.bounded = [[
+            [c for c in L.children[y] if rank[c] < i] for y in topo[i:]
+        ] for i in range(n + 1)]
+        self.bounded = [[cs for cs in b if cs] for b in self.bounded]
+        self.geq_list = [[j for j in topo if L.leq[i, j]] for i in range(n)]
+        self.first = 1 if bottom_to_bottom and n > 0 else 0
+        self._memo = [{} for _ in range(n + 1)]
+
+    def _options(self, i: int, f: PartialEndomorphism) -> List[int]:
+        'Candidates for f[topo[i]] given f[topo[:i]]'
+        children = self.L.children[self.topo[i]]
+        return self.geq_list[self.L.lub_of_many(f[x] for x in children)]
+
+    def _count(self, i: int, f: PartialEndomorphism) -> int:
+        'Number of monotone completions of f[topo[:i]]'
+        if i == self.L.n:
+            return 1
+        lub_of_many = self.L.lub_of_many
+        key = tuple(lub_of_many(f[c] for c in cs) for cs in self.bounded[i])
+        memo = self._memo[i]
+        if key not in memo:
+            x = self.topo[i]
+            options = self._options(i, f)
+            if i == self.L.n - 1:
+                memo[key] = len(options)
+            else:
+                total = 0
+                for k in options:
+                    f[x] = k
+                    total += self._count(i + 1, f)
+                f[x] = None
+                memo[key] = total
+        return memo[key]
+
+    def _empty(self) -> PartialEndomorphism:
+        f = partial_endomorphism(self.L.n)
+        if self.first == 1:
+            f[self.L.bottom] = self.L.bottom
+        return f
+
+    def count(self) -> int:
+        'Number of monotone functions'
+        if self.L.n == 0:
+            return 0
+        return self._count(self.first, self._empty())
+
+    def rank(self, f: Endomorphism) -> int:
+        'Position of f in f_iter_monotones. Throws if f is not there'
+        n = self.L.n
+        assert len(f) == n, f'Invalid function {f} for size {n}'
+        g = self._empty()
+        if self.first:
+            bottom = self.L.bottom
+            assert f[bottom] == bottom, f'{f} does not fix bottom'
+        total = 0
+        for i in range(self.first, n):
+            x = self.topo[i]
+            options = self._options(i, g)
+            if f[x] not in options:
+                raise NotMonotoneFunction(self.L, f'{f}, at {x}', f=f)
+            for k in options[:options.index(f[x])]:
+                g[x] = k
+                total += self._count(i + 1, g)
+            g[x] = f[x]
+        return total
+
+    def unrank(self, index: int) -> Endomorphism:
+        'Function at the given position of f_iter_monotones'
+        return self._unrank(index)[0]
+
+    def _unrank(self, index: int) -> Tuple[Endomorphism, List[int]]:
+        'Function at the given position and its path in the backtracking'
+        total = self.count()
+        assert 0 <= index < total, f'Index {index} out of range({total})'
+        n = self.L.n
+        f = self._empty()
+        path = [0] * n
+        for i in range(self.first, n):
+            x = self.topo[i]
+            for idx, k in enumerate(self._options(i, f)):
+                f[x] = k
+                c = self._count(i + 1, f)
+                if index < c:
+                    path[i] = idx
+                    break
+                index -= c
+        return cast(Endomorphism, f), path
+
+    def cursor(self, index: int) -> Cursor:
+        '''
+        Cursor from which f_iter_monotones starts at the given position.
+        Useful for sharding: islice(f_iter_monotones(cursor=...), size)
+        '''
+        if index == 0:
+            return Cursor()
+        _, path = self._unrank(index - 1)
+        signature = (self.L.leq, self.bottom_to_bottom)
+        return Cursor({
+            'name': 'f_iter_monotones',
+            'signature': Cursor.signature(*signature),
+            'path': path,
+            'done': False,
+        })
+
+
+def _monotone_ranking(L: _Lattice, bottom_to_bottom: bool) -> MonotoneRanking:
+    return L._f_monotones_ranking(bottom_to_bottom)
+
+
+def count_f_monotones(L: _Lattice, bottom_to_bottom: bool = False):
+    'Number of monotone functions, in the order of f_iter_monotones'
+    return _monotone_ranking(L, bottom_to_bottom).count()
+
+
+def f_rank_monotone(L: _Lattice, f: Endomorphism,
+                    bottom_to_bottom: bool = False):
+    'Position of f in f_iter_monotones(bottom_to_bottom)'
+    return _monotone_ranking(L, bottom_to_bottom).rank(f)
+
+
+def f_unrank_monotone(L: _Lattice, index: int, bottom_to_bottom: bool = False):
+    'Function at position index of f_iter_monotones(bottom_to_bottom)'
+    return _monotone_ranking(L, bottom_to_bottom).unrank(index)
+
+
+def f_monotones_cursor(L: _Lattice, index: int,
+                       bottom_to_bottom: bool = False):
+    'Cursor from which f_iter_monotones(bottom_to_bottom) starts at index'
+    return _monotone_ranking(L, bottom_to_bottom).cursor(index)
 
 
 def _f_iter_monotones_restricted(
@@ -320,12 +849,16 @@ def f_is_lub_of_irreducibles(self: _Lattice, f):
 
 
 def f_iter_lub(self: _Lattice, bottom_to_bottom: bool = True,
-               in_place: bool = False):
+               in_place: bool = False, cursor: Optional[Cursor] = None):
+    '''
+    all functions that preserve lub.
+    See help(Cursor) for checkpoint and resume.
+    '''
     # if self.is_distributive:
     #     yield from f_iter_lub_distributive(self, bottom_to_bottom, in_place)
     # NOT WORKING: python3 -m avispa_lattices.testing.vtest_random_f
     # else:
-    yield from f_iter_lub_bruteforce(self, bottom_to_bottom, in_place)
+    yield from f_iter_lub_pruned(self, bottom_to_bottom, in_place, cursor)
     return
 
 
@@ -338,6 +871,126 @@ def f_iter_lub_bruteforce(self: _Lattice, bottom_to_bottom: bool = True,
     return
 
 
+def f_iter_lub_pruned(L: _Lattice, bottom_to_bottom: bool = True,
+                      in_place: bool = False,
+                      cursor: Optional[Cursor] = None):
+    '''
+    all functions that preserve lub, by backtracking in toposort order.
+
+    Elements with at most one child range over the elements above the
+    image of their child (like in f_iter_monotones), while the others are
+    forced to f[x] = lub(f[children of x]). Since f must satisfy
+        f[k] <= lub[f[i],f[j]] for each irreducible k <= lub[i,j],
+    the partial function is pruned as soon as one of these constraints
+    fails for some k, i, j that have already been assigned. Elements with
+    2+ children are visited as soon as possible to prune earlier.
+
+    Same output as f_iter_lub_bruteforce, possibly in a different order.
+    '''
+    if not in_place:
+        it = f_iter_lub_pruned(L, bottom_to_bottom, True, cursor)
+        yield from post(it, in_place=False)
+        return
+    if L.n == 0:
+        return
+    search = _lub_search(L, bottom_to_bottom)
+    signature = (L.leq, bottom_to_bottom)
+    it = _backtrack(search.first, L.n, search.options, search.assign,
+                    'f_iter_lub_pruned', signature, cursor)
+    yield from (search.f for _ in it)
+
+
+def f_iter_lub_orbits(L: _Lattice, bottom_to_bottom: bool = True,
+                      in_place: bool = False,
+                      cursor: Optional[Cursor] = None):
+    '''
+    pairs (f, orbit_size) with one function f that preserves lub per orbit
+    under the automorphisms of L. See help(_iter_orbits).
+    '''
+    if L.n == 0:
+        return
+    search = _lub_search(L, bottom_to_bottom)
+    signature = (L.leq, bottom_to_bottom)
+    yield from _iter_orbits(L, search, 'f_iter_lub_orbits', signature,
+                            in_place, cursor)
+
+
+def _lub_search(L: _Lattice, bottom_to_bottom: bool):
+    # Shortcuts
+    n = L.n
+    leq = L.leq
+    lub = L.lub
+    children = L.children
+    lub_of_many = L.lub_of_many
+    f = partial_endomorphism(n)
+    f_arr = np.zeros(n, dtype=int)
+    geq_list = [[j for j in L.toposort_bottom_up if leq[i, j]] for i in range(n)]
+    forced = [len(children[x]) >= 2 for x in range(n)]
+    topo = _toposort_preferring(L, forced)
+    constraints = _lub_constraints(L, topo)
+
+    def options(i):
+        'f[topo[j]] is fixed for all j<i'
+        x = topo[i]
+        min_value = lub_of_many(f[c] for c in children[x])
+        return [min_value] if forced[x] else geq_list[min_value]
+
+    def assign(i, k):
+        K, I, J = constraints[i]
+        f[topo[i]] = f_arr[topo[i]] = k
+        return leq[f_arr[K], lub[f_arr[I], f_arr[J]]].all()
+
+    first = 0
+    if bottom_to_bottom:
+        f[L.bottom] = f_arr[L.bottom] = L.bottom
+        assert L.bottom == topo[0]
+        first = 1
+    return _Search(first, topo, f, options, assign)
+
+
+def _lub_constraints(L: _Lattice, topo: List[int]):
+    '''
+    Triplets (k, i, j) with k irreducible, k <= lub[i,j], k !<= i, k !<= j,
+    grouped by the position in topo at which all of k, i, j are known.
+    '''
+    n = L.n
+    leq = L.leq
+    lub = L.lub
+    rank = np.zeros(n, dtype=int)
+    rank[topo] = np.arange(n)
+    K = np.array(L.irreducibles, dtype=int)
+    # ok[a,i,j] = K[a] <= lub[i,j] and K[a] !<= i and K[a] !<= j, with i<j
+    ok = leq[K[:, None, None], lub[None, :, :]]
+    ok &= ~leq[K, :][:, :, None] & ~leq[K, :][:, None, :]
+    ok &= np.triu(np.ones((n, n), dtype=bool), k=1)[None, :, :]
+    a, i, j = np.nonzero(ok)
+    k = K[a]
+    ready = np.maximum(rank[k], np.maximum(rank[i], rank[j]))
+    return [(k[ready == r], i[ready == r], j[ready == r]) for r in range(n)]
+
+
+def _toposort_preferring(P: _Poset, preferred: Sequence[bool]) -> List[int]:
+    'toposort of P that visits preferred elements as soon as possible'
+    n = P.n
+    parents = P.parents
+    rank = [0] * n
+    for i, x in enumerate(P.toposort_bottom_up):
+        rank[x] = i
+    indeg = [len(l) for l in P.children]
+    key = lambda x: (not preferred[x], rank[x], x)
+    q = [key(x) for x in range(n) if indeg[x] == 0]
+    heapq.heapify(q)
+    topo: List[int] = []
+    while q:
+        *_, u = heapq.heappop(q)
+        topo.append(u)
+        for v in parents[u]:
+            indeg[v] -= 1
+            if indeg[v] == 0:
+                heapq.heappush(q, key(v))
+    return topo
+
+
 class NotLUBFunction(ValidationError):
     _message = 'f does not preserve lub'
 
@@ -1,6 +1,6 @@
 from __future__ import annotations
 from functools import wraps
-from typing import TYPE_CHECKING, Any, Callable, Iterable, List, Optional, Tuple, TypeVar
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Iterator, List, Optional, Tuple, Type, TypeVar
 from typing_extensions import Protocol
 import numpy as np
 # from ..function_operations import fix_f_naive, fix_f_naive_upwards
@@ -10,6 +10,52 @@ from ..utils._function_types import Endomorphism, partial_endomorphism
 if TYPE_CHECKING:
     from .lattice import Lattice as _Lattice, Poset as _Poset, Relation as _Relation
 
+
+def iter_downsets(P: _Poset) -> Iterator[np.ndarray]:
+    '''
+    Boolean masks of all the down-sets of P, starting with the empty one.
+    Elements are decided in bottom-up order, and x can only be included
+    if all its children are.
+    '''
+    D = np.zeros(P.n, dtype=bool)
+    topo = P.toposort_bottom_up
+    children = P.children
+
+    def rec(i):
+        if i == len(topo):
+            yield D.copy()
+            return
+        x = topo[i]
+        yield from rec(i + 1)
+        if all(D[c] for c in children[x]):
+            D[x] = True
+            yield from rec(i + 1)
+            D[x] = False
+
+    yield from rec(0)
+
+
+def count_downsets(P: _Poset, limit: Optional[int] = None) -> int:
+    'Number of down-sets of P, or limit+1 if there are more than limit'
+    count = 0
+    for _ in iter_downsets(P):
+        count += 1
+        if limit is not None and count > limit:
+            break
+    return count
+
+
+def downset_lattice(P: _Poset, cls: Type[_Lattice]) -> _Lattice:
+    '''
+    Distributive lattice of the down-sets of P ordered by inclusion.
+    By Birkhoff's theorem, every finite distributive lattice is of this
+    form for a unique poset P up to isomorphism (its join irreducibles).
+    '''
+    D = np.array(list(iter_downsets(P)), dtype=bool)
+    leq = ~(D[:, None, :] & ~D[None, :, :]).any(axis=2)
+    leq.flags.writeable = False
+    return cls(leq, check=False)
+
 if False:
 
     def random_downset(P: _Poset):
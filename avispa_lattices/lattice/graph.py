@@ -49,13 +49,18 @@ def _parse_domain(n: int, domain: Sequence[int] | Sequence[bool]) -> List[int]:
 
 
 def subgraph(P: Poset, domain: Sequence[int] | Sequence[bool]):
+    '''
+    Sub-order of P restricted to domain, in the order given by domain.
+    If domain is a range of consecutive elements, the matrix of the
+    result is a view that shares the memory of P.leq.
+    '''
     domain = _parse_domain(P.n, domain)
     m = len(domain)
     leq = P.leq
-    sub = np.zeros((m, m), dtype=bool)
-    for i in range(m):
-        for j in range(m):
-            sub[i, j] = leq[domain[i], domain[j]]
+    if m > 0 and list(domain) == list(range(domain[0], domain[0] + m)):
+        sub = leq[domain[0]:domain[0] + m, domain[0]:domain[0] + m]
+    else:
+        sub = leq[np.ix_(domain, domain)]
     sub.flags.writeable = False
     P_labels = P._labels
     labels = tuple(P_labels[i] for i in domain)
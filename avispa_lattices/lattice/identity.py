@@ -1,111 +1,352 @@
 from __future__ import annotations
 from fractions import Fraction
 import itertools
-from typing import TYPE_CHECKING, Iterable, Iterator, List, Optional, Sequence, Tuple, TypeVar, Union, cast
+from typing import TYPE_CHECKING, Iterable, Iterator, List, NamedTuple, Optional, Sequence, Tuple, TypeVar, Union, cast
 
 if TYPE_CHECKING:
     from .lattice import Lattice, Poset, Relation
     T_Relation = TypeVar('T_Relation', Relation, Poset, Lattice)
 
-from math import factorial
+from math import factorial, prod
 from collections import deque
 import numpy as np
-from ..utils.numpy_types import npUInt64Matrix, npInt64Array
+from ..utils.numpy_types import npBoolMatrix, npUInt64Matrix, npInt64Array
 import xxhash
 from .graph import heights
+from . import refinement
 
 Ints = Union[Sequence[int], npInt64Array]
 
 
-def hasher(ints: Sequence[int]):
+HASH_VERSION = 2
+'''
+Version of the hashes computed by default. Hashes of different versions
+are incomparable. Stored hashes of an older version can be migrated by
+recomputing them with hash_poset(P, version=old) and hash_poset(P).
+    1: hasher_v1, over the decimal formatting of the integers.
+    2: hasher, over the raw bytes of the integers.
+'''
+
+
+def hasher(ints: Ints):
     '''
     Fast numeric hashing function that is consistent across runs.
     Independent of PYTHONHASHSEED unlike Python's hash.
+    Hashes the bytes of ints as a little-endian int64 array.
     The output space is range(2**63), i.e. 1e18 approximately 
     '''
-    uint64hash = xxhash.xxh64_intdigest(str(ints)[1:-1])
+    data = np.ascontiguousarray(ints, dtype='<i8').tobytes()
+    uint64hash = xxhash.xxh64_intdigest(data)
     int64hash = uint64hash >> 1  # Prevent overflow
     return int64hash
 
 
-def _hash(P: Poset, rounds: int):
-    elems = _hash_elems(P, rounds=rounds, salt=0)
-    return hasher(sorted(elems))
+def hasher_v1(ints: Ints):
+    '''
+    Hashing function of version 1 (see HASH_VERSION). Slower than hasher
+    because it formats the integers as a string. The integers are
+    converted to Python ints first, so the string does not depend on how
+    the installed numpy prints its scalars.
+    '''
+    text = ', '.join(str(int(x)) for x in ints)
+    uint64hash = xxhash.xxh64_intdigest(text)
+    int64hash = uint64hash >> 1  # Prevent overflow
+    return int64hash
+
+
+_hashers = {1: hasher_v1, 2: hasher}
+
 
+HASH_ROUNDS = 2
+HASH_SALT = 0
+'Parameters of _hash_elems for P.hash and P.hash_elems'
 
-def _hash_elems(P: Poset, rounds: int, salt: int):
+
+def hash_poset(P: Poset, version: int = HASH_VERSION):
+    'hash number for P, invariant under reindexing'
+    if version == HASH_VERSION:
+        elems = P.hash_elems
+    else:
+        elems = _hash_elems(P, HASH_ROUNDS, HASH_SALT, version=version)
+    return _hashers[version](sorted(elems))
+
+
+FINGERPRINT_VERSION = 2
+'''
+Version of the fingerprints computed by default. See fingerprint.
+    1: hash_poset of version 1, with 2 rounds and salt 0.
+    2: hash_poset of version 2, with 2 rounds and salt 0.
+'''
+
+_fingerprints = {
+    # version: (hash version, rounds, salt)
+    1: (1, 2, 0),
+    2: (2, 2, 0),
+}
+
+
+def fingerprint(P: Poset, version: int = FINGERPRINT_VERSION) -> int:
+    '''
+    Persistent hash of P up to isomorphism, in range(2**63).
+
+    Unlike P.hash, whose definition may change in future releases, the
+    fingerprint of each version is frozen: the same poset has the same
+    fingerprint in every release and machine, so fingerprints stored by
+    one run can be joined against the ones of later runs. Fingerprints
+    of different versions are incomparable, so store the version too.
+    '''
+    assert version in _fingerprints, f'Unknown fingerprint version {version}'
+    spec = _fingerprints[version]
+    if spec == (HASH_VERSION, HASH_ROUNDS, HASH_SALT):
+        return P.hash
+    hash_version, rounds, salt = spec
+    elems = _hash_elems(P, rounds, salt, version=hash_version)
+    return _hashers[hash_version](sorted(elems))
+
+
+def _hash(P: Poset, rounds: int, version: int = HASH_VERSION):
+    elems = _hash_elems(P, rounds=rounds, salt=0, version=version)
+    return _hashers[version](sorted(elems))
+
+
+def _hash_elems(P: Poset, rounds: int, salt: int,
+                version: int = HASH_VERSION):
     mat: npUInt64Matrix = P.leq.astype(np.int64)
     with np.errstate(over='ignore'):
-        H = hash_perm_invariant(P, salt + mat)
+        H = hash_perm_invariant(P, salt + mat, version)
         for repeat in range(rounds):
             mat += np.matmul(H[:, None], H[None, :])
-            H = hash_perm_invariant(P, salt + mat)
+            H = hash_perm_invariant(P, salt + mat, version)
     return cast(npInt64Array, H)
 
 
-def hash_perm_invariant(P: Poset, mat: npUInt64Matrix):
-    h = lambda l: hasher(sorted(l))
-    a = [hasher((h(mat[:, i]), h(mat[i, :]))) for i in range(P.n)]
-    return np.array(a, dtype=np.int64)
+def hash_rows(mat: npUInt64Matrix) -> npInt64Array:
+    'hasher applied to each row of mat, i.e. [hasher(row) for row in mat]'
+    mat = np.ascontiguousarray(mat, dtype='<i8')
+    m = prod(mat.shape[:-1])
+    if m >= _XXH_MIN_ROWS and mat.shape[-1] <= _XXH_MAX_WIDTH:
+        rows = mat.reshape(m, mat.shape[-1]).view('<u8')
+        out = (_xxh64_rows(rows) >> np.uint64(1)).astype(np.int64)
+        return out.reshape(mat.shape[:-1])
+    data = memoryview(mat.tobytes())
+    step = mat.shape[-1] * 8
+    intdigest = xxhash.xxh64_intdigest
+    out = [intdigest(data[k * step:(k + 1) * step]) >> 1 for k in range(m)]
+    return np.array(out, dtype=np.int64).reshape(mat.shape[:-1])
+
+
+_XXH_MIN_ROWS = 1024
+_XXH_MAX_WIDTH = 16
+'''
+_xxh64_rows is used for at least _XXH_MIN_ROWS rows of at most
+_XXH_MAX_WIDTH integers. Otherwise, calling xxhash row by row is as fast
+or faster, because its cost per row is small compared with a numpy pass
+over each integer of the row.
+'''
+
+_XXH_P1 = np.uint64(11400714785074694791)
+_XXH_P2 = np.uint64(14029467366897019727)
+_XXH_P3 = np.uint64(1609587929392839161)
+_XXH_P4 = np.uint64(9650029242287828579)
+_XXH_P5 = np.uint64(2870177450012600261)
+
+
+def _rotl(x, r: int):
+    return (x << np.uint64(r)) | (x >> np.uint64(64 - r))
+
+
+def _xxh64_round(acc, lane):
+    return _rotl(acc + lane * _XXH_P2, 31) * _XXH_P1
+
+
+def _xxh64_rows(rows: np.ndarray) -> np.ndarray:
+    '''
+    xxh64 (seed 0) of the bytes of each row of the (m, w) uint64 array,
+    computed for all the rows at once. The loops run over the w lanes
+    only, so this is the same as xxhash.xxh64_intdigest(row.tobytes())
+    for each row, but vectorized across rows.
+    '''
+    m, w = rows.shape
+    lanes = np.ascontiguousarray(rows.T)
+    with np.errstate(over='ignore'):
+        i = 0
+        if w >= 4:
+            v = [np.full(m, x, dtype=np.uint64) for x in
+                 (_XXH_P1 + _XXH_P2, _XXH_P2, np.uint64(0), -_XXH_P1)]
+            for i in range(0, w - 3, 4):
+                for j in range(4):
+                    v[j] = _xxh64_round(v[j], lanes[i + j])
+            i += 4
+            h = _rotl(v[0], 1) + _rotl(v[1], 7) + _rotl(v[2], 12)
+            h += _rotl(v[3], 18)
+            for j in range(4):
+                h ^= _xxh64_round(np.uint64(0), v[j])
+                h = h * _XXH_P1 + _XXH_P4
+        else:
+            h = np.full(m, _XXH_P5, dtype=np.uint64)
+        h += np.uint64(8 * w)
+        for i in range(i, w):
+            h ^= _xxh64_round(np.uint64(0), lanes[i])
+            h = _rotl(h, 27) * _XXH_P1 + _XXH_P4
+        h ^= h >> np.uint64(33)
+        h *= _XXH_P2
+        h ^= h >> np.uint64(29)
+        h *= _XXH_P3
+        h ^= h >> np.uint64(32)
+    return h
+
+
+def hash_perm_invariant(P: Poset, mat: npUInt64Matrix,
+                        version: int = HASH_VERSION):
+    if version == 1:
+        h = lambda l: hasher_v1(sorted(l))
+        a = [hasher_v1((h(mat[:, i]), h(mat[i, :]))) for i in range(P.n)]
+        return np.array(a, dtype=np.int64)
+    cols_rows = np.concatenate([np.sort(mat, axis=0).T, np.sort(mat, axis=1)])
+    return hash_rows(hash_rows(cols_rows).reshape(2, -1).T)
+
+
+def is_isomorphic(P: Poset, other: Poset):
+    '''
+    Compares the canonical forms, after a quick check of the hashes.
+    If the hashes of the elements leave only a few candidate isomorphisms,
+    they are checked instead, because it is cheaper.
+    '''
+    if P.n != other.n or hash(P) != hash(other):
+        return False
+    total, it = isomorphism_candidates(P.hash_elems, other.hash_elems)
+    if total <= P.n:
+        A = P.leq
+        B = other.leq
+        return any((A == B[np.ix_(f, f)]).all() for f in it)
+    return P._canonization.leq.tobytes() == other._canonization.leq.tobytes()
+
+
+class Automorphisms(NamedTuple):
+    '''
+    Automorphism group of a poset:
+        generators: permutations f that generate the group.
+        orbits: sorted list of the orbits of the elements.
+        order: number of automorphisms.
+    '''
+    generators: List[List[int]]
+    orbits: List[List[int]]
+    order: int
+
+
+def automorphisms(P: Poset) -> Automorphisms:
+    'Automorphism group of P, found while computing the canonical form'
+    n = P.n
+    _, _, generators, base = P._canonization
+    orbit = refinement.orbits(generators, n)
+    orbits: List[List[int]] = [[] for _ in range(n)]
+    for x in range(n):
+        orbits[orbit[x]].append(x)
+    orbits = [l for l in orbits if l]
+    order = refinement.group_order(generators, base, n)
+    return Automorphisms(generators, orbits, order)
+
+
+def hash_stack(leqs: npBoolMatrix, elems: bool = False):
+    '''
+    Hashes of a stack of k posets of the same size n given as a (k, n, n)
+    boolean array, all at once. Returns the array of the k values of
+    P.hash, and if elems==True, also the (k, n) array of P.hash_elems.
+    The sorting and the refinement rounds run on the whole stack, and so
+    does the hashing of rows while n is at most _XXH_MAX_WIDTH. For larger
+    n, rows of n integers are hashed one by one (see hash_rows), and the
+    batch is only moderately faster than hashing each poset.
+    '''
+    leqs = np.asarray(leqs, dtype=bool)
+    k, n, _ = leqs.shape
+    mat = leqs.astype(np.int64)
+    with np.errstate(over='ignore'):
+        H = _hash_perm_invariant_stack(HASH_SALT + mat)
+        for repeat in range(HASH_ROUNDS):
+            mat += H[:, :, None] * H[:, None, :]
+            H = _hash_perm_invariant_stack(HASH_SALT + mat)
+    hashes = hash_rows(np.sort(H, axis=1))
+    return (hashes, H) if elems else hashes
+
+
+def _hash_perm_invariant_stack(mat: npUInt64Matrix):
+    'hash_perm_invariant for each matrix of the (k, n, n) stack'
+    cols_rows = np.concatenate(
+        [np.sort(mat, axis=1).transpose(0, 2, 1),
+         np.sort(mat, axis=2)], axis=1)
+    k, n = len(mat), mat.shape[1]
+    return hash_rows(hash_rows(cols_rows).reshape(k, 2, n).transpose(0, 2, 1))
 
 
 def find_isomorphism(P: Poset, other: Poset):
+    return next(iter_isomorphisms(P, other), None)
+
+
+def iter_isomorphisms(P: Poset, other: Poset) -> Iterator[List[int]]:
+    '''
+    all f such that P.leq[i,j] == other.leq[f[i],f[j]] for all i, j.
+    See help(refinement.iter_isomorphisms).
+    '''
     # Quick check:
     if P.n != other.n or hash(P) != hash(other):
-        return None
+        return
+    yield from refinement.iter_isomorphisms(P.leq, other.leq)
 
-    # Find the isomorphism
-    n = P.n
-    A = P.leq
-    B = other.leq
-    IJ = [(i, j) for i in range(n) for j in range(n)]
-
-    def is_isomorphism(f):
-        return all(A[i, j] == B[f[i], f[j]] for i, j in IJ)
-
-    Ah = P.hash_elems
-    Bh = other.hash_elems
-    total, it = isomorphism_candidates(Ah, Bh)
-    if total > n**2:
-        # Try to hash more deeply to separate
-        AAh = Ah + _hash_elems(P, rounds=4, salt=1)
-        BBh = Bh + _hash_elems(other, rounds=4, salt=1)
-        total, it = isomorphism_candidates(AAh, BBh)
-
-    f: List[int]
-    for f in it:
-        if is_isomorphism(f):
-            return f
-    return None
-
-
-def reindex(P: T_Relation, f, inverse=False, reset_labels=False) -> T_Relation:
-    'Reindexed copy of P such that i is to P as f[i] to out'
-    'If inverse==True, then f[i] is to P as i to out'
+
+def reindex(P: T_Relation, f, inverse=False, reset_labels=False,
+            carry=False) -> T_Relation:
+    '''
+    Reindexed copy of P such that i is to P as f[i] to out.
+    If inverse==True, then f[i] is to P as i to out.
+    If carry==True, the cached tables of P that are already computed
+    (see _carried) are permuted into out instead of recomputed later.
+    '''
     n = P.n
-    assert len(f) == n and sorted(set(f)) == list(
-        range(n)), f'Invalid permutation {f}'
-    if inverse:
-        inv = [0] * n
-        for i in range(n):
-            inv[f[i]] = i
-        f = inv
-    leq = P.leq
-    out = np.zeros_like(leq)
-    for i in range(n):
-        for j in range(n):
-            out[f[i], f[j]] = leq[i, j]
+    f = np.asarray(f, dtype=int).reshape(n)
+    assert (np.sort(f) == np.arange(n)).all(), f'Invalid permutation {f}'
+    # out[k, l] = leq[inv[k], inv[l]]
+    inv = f if inverse else np.argsort(f)
+    out = P.leq[np.ix_(inv, inv)]
     out.flags.writeable = False
     out_labels: Optional[Sequence[str]]
     if reset_labels:
         out_labels = None
     else:
         P_labels = P._labels
-        out_labels = ['' for i in range(n)]
-        for i in range(n):
-            out_labels[f[i]] = P_labels[i]
-        out_labels = tuple(out_labels)
-    return P.__class__(out, False, labels=out_labels)
+        out_labels = tuple(P_labels[i] for i in inv)
+    Q = P.__class__(out, False, labels=out_labels)
+    if carry:
+        _carry(P, Q, inv)
+    return Q
+
+
+_carried = {
+    'child': 'matrix',
+    'dist': 'matrix',
+    'lub': 'matrix of elements',
+    'hash_elems': 'vector',
+    'hash': 'invariant',
+    'canonical': 'invariant',
+}
+
+
+def _carry(P: Relation, Q: Relation, inv: npInt64Array):
+    'Copy the computed tables of P into Q = P reindexed by inv'
+    f = np.argsort(inv)
+    for name, kind in _carried.items():
+        if name not in P.__dict__:
+            continue
+        value = P.__dict__[name]
+        if kind == 'matrix':
+            value = value[np.ix_(inv, inv)]
+        elif kind == 'matrix of elements':
+            value = f[value[np.ix_(inv, inv)]]
+        elif kind == 'vector':
+            value = value[inv]
+        if isinstance(value, np.ndarray):
+            value.flags.writeable = False
+        Q.__dict__[name] = value
+    return
 
 
 def canonical_rank_OLD(P: Poset):
@@ -135,6 +376,15 @@ def canonical_rank_OLD(P: Poset):
 
 
 def canonical_rank(P: Poset):
+    '''
+    Certified canonical labeling: P and Q are isomorphic if and only if
+    P.reindex(canonical_rank(P)).leq == Q.reindex(canonical_rank(Q)).leq.
+    It is a linear extension of P. See help(refinement.canonize).
+    '''
+    return P._canonization.rank
+
+
+def canonical_rank_layered(P: Poset):
     'equivalent poset with enumerated labels and stable order'
     n = P.n
     pa = P.parents
@@ -43,4 +43,17 @@ def up_edges_to_leq(n, edges: Iterable[Tuple[int, int]]):
         leq[des, anc] = True
     leq = transitive_closure(leq)
     leq.flags.writeable = False
-    return leq
\ No newline at end of file
+    return leq
+
+
+def leq_to_bytes(leq: npBoolMatrix) -> bytes:
+    'packed bits of the (flattened) relation matrix'
+    return np.packbits(leq, axis=None).tobytes()
+
+
+def bytes_to_leq(n: int, data: bytes) -> npBoolMatrix:
+    'inverse of leq_to_bytes'
+    bits = np.unpackbits(np.frombuffer(data, dtype=np.uint8), count=n * n)
+    leq = bits.astype(bool).reshape((n, n))
+    leq.flags.writeable = False
+    return leq
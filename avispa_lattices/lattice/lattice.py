@@ -11,6 +11,7 @@ from ..utils.numpy_types import npBoolMatrix, npUInt64Matrix
 from .. import utils
 from ..utils.methodtools import implemented_at
 from . import validation, identity, graph, interface, description, random_function
+from . import refinement
 
 from .. import function_operations
 from .. import function_iteration
@@ -100,8 +101,8 @@ class Relation:
     def copy(self, check=False):
         return _copy_as_type(self, self.__class__, check=check)
 
-    def reindex(self, rank: List[int], inverse=False):
-        return identity.reindex(self, rank, inverse=inverse)
+    def reindex(self, rank: List[int], inverse=False, carry=False):
+        return identity.reindex(self, rank, inverse=inverse, carry=carry)
 
     @property
     def _labels(self):
@@ -259,21 +260,36 @@ class Poset(Relation):
     @cached_property
     def hash(self):
         'hash number for this poset'
-        return identity.hasher(sorted(self.hash_elems))
+        return identity.hash_poset(self)
 
     @cached_property
     def hash_elems(self):
         'hash for each element of the poset w.r.t. the poset order'
-        return identity._hash_elems(self, rounds=2, salt=0)
+        return identity._hash_elems(self, identity.HASH_ROUNDS,
+                                    identity.HASH_SALT)
+
+    @implemented_at(identity.fingerprint)
+    def fingerprint(self, *args, **kwargs):
+        ...
 
     def __eq__(self, other: Poset):
         'Equality up to isomorphism, i.e. up to reindexing'
-        return identity.find_isomorphism(self, other) is not None
+        return identity.is_isomorphic(self, other)
+
+    @cached_property
+    def _canonization(self):
+        return refinement.canonize(self.leq)
+
+    @cached_property
+    def automorphisms(self):
+        'generators, orbits and order of the automorphism group'
+        return identity.automorphisms(self)
 
     @cached_property
     def canonical(self):
+        'isomorphic copy that is the same for all isomorphic posets'
         rank = identity.canonical_rank(self)
-        P = self.reindex(rank)
+        P = self.reindex(rank, carry=True)
         P.labels = None
         return P
 
@@ -357,6 +373,11 @@ class Poset(Relation):
     def toposort_bottom_up(self):
         return graph.toposort_bottom_up(self)
 
+    @cached_property
+    def toporank(self):
+        'position of each element in toposort_bottom_up'
+        return graph.toporank(self)
+
     @cached_property
     def bottoms(self):
         return graph.bottoms(self)
@@ -373,6 +394,14 @@ class Poset(Relation):
     def f_iter_monotones(self, *args, **kwargs):
         ...
 
+    @implemented_at(function_iteration.f_iter_monotones_poset_chunks)
+    def f_iter_monotones_chunks(self, *args, **kwargs):
+        ...
+
+    @implemented_at(function_iteration.count_f_monotones_poset)
+    def f_count_monotones(self, *args, **kwargs):
+        ...
+
     @implemented_at(random_function.random_f_monotone_poset)
     def random_f_monotone(self, *args, **kwargs):
         ...
@@ -508,6 +537,30 @@ class Lattice(Poset):
     def f_iter_monotones(self, *args, **kwargs):
         ...
 
+    @implemented_at(function_iteration.f_iter_monotones_orbits)
+    def f_iter_monotones_orbits(self, *args, **kwargs):
+        ...
+
+    @implemented_at(function_iteration.count_f_monotones)
+    def f_count_monotones(self, *args, **kwargs):
+        ...
+
+    @implemented_at(function_iteration.f_rank_monotone)
+    def f_rank_monotone(self, *args, **kwargs):
+        ...
+
+    @implemented_at(function_iteration.f_unrank_monotone)
+    def f_unrank_monotone(self, *args, **kwargs):
+        ...
+
+    @implemented_at(function_iteration.f_monotones_cursor)
+    def f_monotones_cursor(self, *args, **kwargs):
+        ...
+
+    @cached_method(maxsize=2)
+    def _f_monotones_ranking(self, bottom_to_bottom: bool):
+        return function_iteration.MonotoneRanking(self, bottom_to_bottom)
+
     @implemented_at(random_function.random_f_monotone)
     def random_f_monotone(self, *args, **kwargs):
         ...
@@ -516,6 +569,10 @@ class Lattice(Poset):
     def f_iter_lub(self, *args, **kwargs):
         ...
 
+    @implemented_at(function_iteration.f_iter_lub_orbits)
+    def f_iter_lub_orbits(self, *args, **kwargs):
+        ...
+
     @implemented_at(function_iteration.f_is_lub)
     def f_is_lub(self, *args, **kwargs):
         ...
@@ -0,0 +1,111 @@
+from __future__ import annotations
+from typing import Dict, Generic, Iterable, Iterator, List, Tuple, Type, TypeVar
+import numpy as np
+
+from . import interface, refinement
+from .lattice import Poset
+
+T_Poset = TypeVar('T_Poset', bound=Poset)
+
+
+class PosetIndex(Generic[T_Poset]):
+    '''
+    Set of posets up to isomorphism, with O(1) membership.
+
+    Posets are bucketed by (n, P.hash), and each bucket holds the packed
+    bits of a canonical form of each isomorphism class (see certificate).
+    Only these bytes are stored, and the posets are rebuilt as instances
+    of cls when iterating.
+
+        index = PosetIndex(Lattice)
+        for L in candidates:
+            if index.add(L):
+                ...  # L is new up to isomorphism
+    '''
+
+    def __init__(self, cls: Type[T_Poset] = Poset,
+                 posets: Iterable[T_Poset] = ()):
+        self.cls = cls
+        self._buckets: Dict[Tuple[int, int], List[bytes]] = {}
+        self._size = 0
+        self._lookups = 0
+        self._comparisons = 0
+        for P in posets:
+            self.add(P)
+
+    @staticmethod
+    def certificate(P: Poset) -> bytes:
+        '''
+        Packed bits of P reindexed by a canonical labeling. The labeling
+        sorts the elements by their hashes, and only if some hashes repeat,
+        the ties are broken with refinement.canonize. This is much cheaper
+        than P.canonical, and canonical as well, but a different one.
+        '''
+        h = P.hash_elems
+        _, colors = np.unique(h, return_inverse=True)
+        if colors.max(initial=-1) + 1 < P.n:
+            rank = refinement.canonize(P.leq, colors.ravel()).rank
+            colors = np.array(rank)
+        order = np.argsort(colors)
+        return interface.leq_to_bytes(P.leq[order][:, order])
+
+    def _bucket(self, P: Poset) -> List[bytes]:
+        self._lookups += 1
+        return self._buckets.get((P.n, P.hash), [])
+
+    def _find(self, bucket: List[bytes], P: Poset):
+        if not bucket:
+            return False, b''
+        self._comparisons += len(bucket)
+        data = self.certificate(P)
+        return data in bucket, data
+
+    def __contains__(self, P: Poset):
+        return self._find(self._bucket(P), P)[0]
+
+    def add(self, P: Poset):
+        'Insert P. Returns False if an isomorphic poset was already there'
+        bucket = self._bucket(P)
+        found, data = self._find(bucket, P)
+        if found:
+            return False
+        if not bucket:
+            data = self.certificate(P)
+            self._buckets[(P.n, P.hash)] = bucket
+        bucket.append(data)
+        self._size += 1
+        return True
+
+    def __len__(self):
+        return self._size
+
+    def __iter__(self) -> Iterator[T_Poset]:
+        for (n, _), bucket in self._buckets.items():
+            for data in bucket:
+                yield self.cls(interface.bytes_to_leq(n, data), check=False)
+
+    def stats(self):
+        '''
+        Dictionary with:
+            size: number of isomorphism classes.
+            buckets: number of distinct (n, hash) pairs.
+            collisions: number of classes that share their hash with an
+                older class of the same size.
+            max_bucket: size of the largest bucket.
+            lookups: number of add and in operations.
+            comparisons: number of certificates compared.
+            bytes: size of the stored certificates.
+        '''
+        sizes = [len(b) for b in self._buckets.values()]
+        return {
+            'size': self._size,
+            'buckets': len(sizes),
+            'collisions': self._size - len(sizes),
+            'max_bucket': max(sizes, default=0),
+            'lookups': self._lookups,
+            'comparisons': self._comparisons,
+            'bytes': sum(len(d) for b in self._buckets.values() for d in b),
+        }
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.stats()})'
@@ -86,9 +86,16 @@ def random_f_monotone_C(L: _Lattice, bottom_to_bottom: bool = False, _prob=0.4):
     return f
 
 
+def random_f_monotone_uniform(L: _Lattice, bottom_to_bottom: bool = False):
+    'uniformly distributed, by unranking a random index'
+    total = L.f_count_monotones(bottom_to_bottom=bottom_to_bottom)
+    return L.f_unrank_monotone(AL_random.randbelow(total), bottom_to_bottom)
+
+
 random_f_monotone.method_A = random_f_monotone_A
 random_f_monotone.method_B = random_f_monotone_B
 random_f_monotone.method_C = random_f_monotone_C
+random_f_monotone.method_uniform = random_f_monotone_uniform
 
 
 def random_f_lub(L: _Lattice, **kwargs):
@@ -0,0 +1,282 @@
+'''
+Partition refinement with individualization for order relations.
+
+A coloring is an array colors such that colors[x] is in range(k) for some
+k and every color in range(k) is used. The cells of the coloring are the
+sets of elements of the same color, ordered by color.
+'''
+from __future__ import annotations
+from typing import Iterator, List, NamedTuple, Optional, Sequence
+import numpy as np
+from ..utils.numpy_types import npBoolMatrix, npInt64Array
+
+
+class Canonization(NamedTuple):
+    '''
+    Result of canonize(leq):
+        rank: canonical labeling. leq reindexed by rank (i is to leq as
+            rank[i] to the canonical leq) is the same for isomorphic inputs.
+        leq: leq reindexed by rank.
+        generators: generators of the automorphism group.
+        base: elements individualized along the first path of the search.
+            The automorphisms that fix all of them are the identity only.
+    '''
+    rank: List[int]
+    leq: npBoolMatrix
+    generators: List[List[int]]
+    base: List[int]
+
+
+def initial_coloring(leq: npBoolMatrix) -> npInt64Array:
+    '''
+    Coloring by the number of elements below and above each element.
+    Since x < y implies that fewer elements are below x than below y,
+    cells are ordered consistently with leq.
+    '''
+    n = len(leq)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+    key = np.stack([leq.sum(axis=0), -leq.sum(axis=1)], axis=1)
+    return _rank_rows(key)
+
+
+def _rank_rows(key: npInt64Array) -> npInt64Array:
+    'Dense rank of the rows of key in lexicographic order'
+    n = len(key)
+    order = np.lexsort(key.T[::-1])
+    key = key[order]
+    rank = np.empty(n, dtype=np.int64)
+    rank[order[0]] = 0
+    rank[order[1:]] = np.cumsum((key[1:] != key[:-1]).any(axis=1))
+    return rank
+
+
+def refine(lt: np.ndarray, colors: npInt64Array) -> npInt64Array:
+    '''
+    Coarsest equitable refinement of colors, where lt is the strict order
+    as a float64 matrix (so that the counts are BLAS products, exact for
+    any practical n): each cell is split according to the number of
+    elements of each color that are below and above each element.
+    The cells keep their relative order and the result is invariant,
+    i.e. relabeling the input relabels the output in the same way.
+    '''
+    n = len(colors)
+    k = int(colors.max()) + 1 if n else 0
+    while k < n:
+        onehot = np.zeros((n, k))
+        onehot[np.arange(n), colors] = 1
+        below = lt.T @ onehot
+        above = lt @ onehot
+        key = np.concatenate([colors[:, None], below, above], axis=1)
+        new_colors = _rank_rows(key.astype(np.int64))
+        new_k = int(new_colors.max()) + 1
+        if new_k == k:
+            break
+        colors, k = new_colors, new_k
+    return colors
+
+
+def individualize(colors: npInt64Array, x: int) -> npInt64Array:
+    'Split x from its cell, placing it right before the rest of the cell'
+    c = colors[x]
+    out = colors + (colors >= c)
+    out[x] = c
+    return out
+
+
+def orbits(generators: Sequence[Sequence[int]], n: int) -> List[int]:
+    'orbit[x] is the smallest element of the orbit of x'
+    parent = list(range(n))
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for g in generators:
+        for x in range(n):
+            a, b = find(x), find(g[x])
+            if a != b:
+                parent[max(a, b)] = min(a, b)
+    return [find(x) for x in range(n)]
+
+
+def group_order(generators: Sequence[Sequence[int]], base: Sequence[int],
+                n: int) -> int:
+    '''
+    Order of the group generated by generators, given a base of it (no
+    element other than the identity fixes all the elements of the base)
+    such that, for each d, the generators that fix base[:d] generate the
+    stabilizer of base[:d] in the group, as returned by canonize.
+    The order is the product of the sizes of the orbits of each base[d]
+    under the stabilizer of base[:d].
+    '''
+    order = 1
+    for d in range(len(base)):
+        fixing = [g for g in generators if all(g[v] == v for v in base[:d])]
+        orbit = orbits(fixing, n)
+        order *= orbit.count(orbit[base[d]])
+    return order
+
+
+def _canonize(leq: npBoolMatrix, colors: npInt64Array) -> Canonization:
+    'canonize(leq, colors) without the twin reduction'
+    n = len(leq)
+    lt = (leq & ~np.eye(n, dtype=bool)).astype(np.float64)
+    generators: List[List[int]] = []
+    leaves = []  # first and best leaves as (certificate, rank, path)
+
+    def leaf(rank: npInt64Array, path: List[int]) -> Optional[int]:
+        inv = np.argsort(rank)
+        cert = np.packbits(leq[inv][:, inv], axis=None).tobytes()
+        if not leaves:
+            leaves[:] = [(cert, rank, path), (cert, rank, path)]
+            return None
+        for other_cert, other_rank, other_path in leaves:
+            if cert == other_cert:
+                generators.append(inv[other_rank].tolist())
+                depth = min(len(path), len(other_path))
+                return next(d for d in range(depth)
+                            if path[d] != other_path[d])
+        if cert < leaves[1][0]:
+            leaves[1] = (cert, rank, path)
+        return None
+
+    def search(colors: npInt64Array, path: List[int]) -> Optional[int]:
+        'Explores the subtree and returns the depth to jump back to'
+        counts = np.bincount(colors, minlength=n)
+        if (counts == 1).all():
+            return leaf(colors, path)
+        cell = np.flatnonzero(colors == np.argmax(counts > 1)).tolist()
+        explored: List[int] = []
+        for x in cell:
+            if explored:
+                fixing = [g for g in generators if all(g[v] == v for v in path)]
+                orbit = orbits(fixing, n)
+                if any(orbit[x] == orbit[y] for y in explored):
+                    continue
+            explored.append(x)
+            child = refine(lt, individualize(colors, x))
+            jump = search(child, path + [x])
+            if jump is not None and jump < len(path):
+                return jump
+        return None
+
+    search(refine(lt, colors), [])
+    _, rank, _ = leaves[1]
+    inv = np.argsort(rank)
+    canonical = leq[np.ix_(inv, inv)]
+    canonical.flags.writeable = False
+    return Canonization(rank.tolist(), canonical, generators, leaves[0][2])
+
+
+def canonize(leq: npBoolMatrix,
+             colors: Optional[npInt64Array] = None) -> Canonization:
+    '''
+    Canonical labeling of the order relation leq.
+
+    Search tree: each node is an equitable coloring. If it is not discrete,
+    its children individualize each element of its first non-singleton
+    cell, followed by refinement. Each leaf is a labeling whose reindexed
+    matrix (the certificate) is compared as packed bytes, and the smallest
+    certificate wins. Since the tree does not depend on the indices, the
+    result is canonical. Two leaves with the same certificate give an
+    automorphism, which is used to skip children that lie in the same
+    orbit as an explored one, and to jump back to the node where the paths
+    of the two leaves diverge.
+    Since the initial coloring is consistent with leq, the canonical
+    labeling is a linear extension, i.e. the canonical leq is upper
+    triangular. A different initial coloring can be given, as long as it
+    is invariant, e.g. the element hashes ranked. Then the labeling is
+    only canonical among the calls that use the same kind of coloring.
+
+    Twins (elements of the same color with the same elements above and
+    below, which any permutation of them preserves) are collapsed first.
+    The quotient is canonized with the class sizes as colors, and each
+    class is expanded into consecutive positions. The permutations of
+    each class are added to the generators as adjacent transpositions.
+    '''
+    n = len(leq)
+    if n == 0:
+        return Canonization([], leq, [], [])
+    if colors is None:
+        colors = initial_coloring(leq)
+    lt = leq & ~np.eye(n, dtype=bool)
+    key = np.concatenate([colors[:, None], lt, lt.T], axis=1)
+    _, first, twin = np.unique(key, axis=0, return_index=True,
+                               return_inverse=True)
+    m = len(first)
+    if m == n:
+        return _canonize(leq, colors)
+    relabel = np.empty(m, dtype=np.int64)
+    relabel[np.argsort(first)] = np.arange(m)
+    twin = relabel[twin.ravel()]
+    members = [np.flatnonzero(twin == c) for c in range(m)]
+    reps = np.sort(first)
+    sizes = np.bincount(twin)
+    quotient_colors = _rank_rows(np.stack([colors[reps], sizes], axis=1))
+    rank_q, _, generators_q, base_q = _canonize(leq[np.ix_(reps, reps)],
+                                                quotient_colors)
+    inv = np.concatenate([members[c] for c in np.argsort(rank_q)])
+    rank = np.empty(n, dtype=np.int64)
+    rank[inv] = np.arange(n)
+    canonical = leq[np.ix_(inv, inv)]
+    canonical.flags.writeable = False
+    generators: List[List[int]] = []
+    for g in generators_q:
+        lifted = np.empty(n, dtype=np.int64)
+        for c in range(m):
+            lifted[members[c]] = members[g[c]]
+        generators.append(lifted.tolist())
+    base = [int(members[c][0]) for c in base_q]
+    for c in np.argsort(rank_q):
+        for a, b in zip(members[c][:-1], members[c][1:]):
+            g = list(range(n))
+            g[a], g[b] = int(b), int(a)
+            generators.append(g)
+            if a not in base:
+                base.append(int(a))
+    return Canonization(rank.tolist(), canonical, generators, base)
+
+
+def iter_isomorphisms(A: npBoolMatrix, B: npBoolMatrix) -> Iterator[List[int]]:
+    '''
+    All f such that A[i,j] == B[f[i],f[j]] for all i, j.
+
+    Refines a common coloring of the disjoint union of A and B. Each
+    step maps the first element of A in the first non-singleton cell to
+    each element of B in that cell, individualizes both with the same
+    color and refines again, pruning as soon as some color has different
+    number of elements in A and B.
+    '''
+    n = len(A)
+    if len(B) != n:
+        return
+    union = np.zeros((2 * n, 2 * n), dtype=bool)
+    union[:n, :n] = A
+    union[n:, n:] = B
+    lt = (union & ~np.eye(2 * n, dtype=bool)).astype(np.float64)
+
+    def search(colors: npInt64Array) -> Iterator[List[int]]:
+        k = int(colors.max()) + 1
+        counts = np.bincount(colors[:n], minlength=k)
+        if (counts != np.bincount(colors[n:], minlength=k)).any():
+            return
+        if (counts == 1).all():
+            f = np.empty(n, dtype=int)
+            f[np.argsort(colors[:n])] = np.argsort(colors[n:])
+            if (A == B[np.ix_(f, f)]).all():
+                yield f.tolist()
+            return
+        c = np.argmax(counts > 1)
+        x = np.argmax(colors[:n] == c)
+        for y in np.flatnonzero(colors[n:] == c):
+            child = individualize(colors, x)
+            child[n + y] = c
+            yield from search(refine(lt, child))
+
+    if n == 0:
+        yield []
+        return
+    yield from search(refine(lt, initial_coloring(union)))
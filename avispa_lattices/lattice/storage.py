@@ -0,0 +1,224 @@
+'''
+Compact binary files of lattices, written as a stream and read with
+random access through a memory map.
+
+Layout (little endian):
+    header: magic b'ALLAT', format version (uint8), 2 padding bytes,
+        number of lattices (uint64), offset of the index (uint64).
+    records: for each lattice, packed bits of the strict upper triangle
+        of its leq matrix, row by row.
+    index: sizes (uint32, one per lattice), followed by offsets (uint64,
+        one per lattice plus the end of the last record).
+
+Records only keep the upper triangle, so each lattice is stored with a
+labeling that is a linear extension, e.g. its canonical form. The index
+and the header are written when the writer is closed.
+
+LatticeRecord is the in-memory counterpart, for keeping many lattices
+without the cached properties of Lattice objects.
+'''
+from __future__ import annotations
+from array import array
+from functools import lru_cache
+from pathlib import Path
+import struct
+from typing import Generic, Iterable, Iterator, Optional, Type, TypeVar, Union
+import numpy as np
+
+from . import interface
+from .lattice import Lattice
+from ..utils.numpy_types import npBoolMatrix
+
+MAGIC = b'ALLAT'
+FORMAT_VERSION = 1
+_header = struct.Struct('<5sBxxQQ')
+
+T_Lattice = TypeVar('T_Lattice', bound=Lattice)
+
+
+@lru_cache(maxsize=64)
+def _upper(n: int):
+    return np.triu_indices(n, 1)
+
+
+def leq_to_record(leq: npBoolMatrix) -> bytes:
+    'packed bits of the strict upper triangle of leq'
+    return np.packbits(leq[_upper(len(leq))]).tobytes()
+
+
+def record_to_leq(n: int, data) -> npBoolMatrix:
+    'inverse of leq_to_record'
+    upper = _upper(n)
+    bits = np.unpackbits(np.frombuffer(data, dtype=np.uint8),
+                         count=len(upper[0]))
+    leq = np.eye(n, dtype=bool)
+    leq[upper] = bits
+    leq.flags.writeable = False
+    return leq
+
+
+class LatticeRecord:
+    '''
+    Compact lattice: size n, packed bits of the leq matrix (see
+    interface.leq_to_bytes) and optionally its hash. About 100 bytes for
+    a lattice of size 10, instead of the several kilobytes of a Lattice
+    with its cached properties. Records are equal iff their matrices are.
+    '''
+    __slots__ = ('n', 'bits', 'hash')
+
+    def __init__(self, n: int, bits: bytes, hash: Optional[int] = None):
+        self.n = n
+        self.bits = bits
+        self.hash = hash
+
+    @classmethod
+    def from_lattice(cls, L: Lattice, hash: bool = False):
+        h = L.hash if hash else None
+        return cls(L.n, interface.leq_to_bytes(L.leq), h)
+
+    @property
+    def leq(self) -> npBoolMatrix:
+        return interface.bytes_to_leq(self.n, self.bits)
+
+    def to_lattice(self, cls: Type[T_Lattice] = Lattice) -> T_Lattice:
+        return cls(self.leq, check=False)
+
+    def __eq__(self, other):
+        if not isinstance(other, LatticeRecord):
+            return NotImplemented
+        return self.n == other.n and self.bits == other.bits
+
+    def __hash__(self):
+        return hash((self.n, self.bits))
+
+    def __getstate__(self):
+        return (self.n, self.bits, self.hash)
+
+    def __setstate__(self, state):
+        self.n, self.bits, self.hash = state
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(n={self.n}, bits={self.bits.hex()})'
+
+
+class LatticeWriter:
+    '''
+    Appends lattices to a new file, one record at a time.
+
+        with LatticeWriter(path) as writer:
+            for L in AL.iter_all_lattices(9, method='augmentation'):
+                writer.append(L)
+
+    Lattices whose labeling is not a linear extension are stored in
+    canonical form. buffer_size is the size in bytes of the write buffer
+    (the default one if negative).
+    '''
+
+    def __init__(self, path: Union[str, Path], buffer_size: int = -1):
+        self.path = Path(path)
+        self._file = open(self.path, 'wb', buffering=buffer_size)
+        self._file.write(_header.pack(MAGIC, FORMAT_VERSION, 0, 0))
+        self._sizes = array('I')
+        self._offsets = array('Q', [_header.size])
+
+    def append(self, L: Union[Lattice, LatticeRecord]):
+        leq = L.leq
+        if np.tril(leq, -1).any():
+            if isinstance(L, LatticeRecord):
+                L = L.to_lattice()
+            leq = L.canonical.leq
+        data = leq_to_record(leq)
+        self._file.write(data)
+        self._sizes.append(L.n)
+        self._offsets.append(self._offsets[-1] + len(data))
+
+    def extend(self, lattices: Iterable[Union[Lattice, LatticeRecord]]):
+        for L in lattices:
+            self.append(L)
+
+    def __len__(self):
+        return len(self._sizes)
+
+    def close(self):
+        if self._file.closed:
+            return
+        index_offset = self._offsets[-1]
+        self._file.write(np.asarray(self._sizes, dtype='<u4').tobytes())
+        self._file.write(np.asarray(self._offsets, dtype='<u8').tobytes())
+        self._file.seek(0)
+        self._file.write(
+            _header.pack(MAGIC, FORMAT_VERSION, len(self), index_offset))
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class LatticeFile(Generic[T_Lattice]):
+    '''
+    Read-only view of a file made by LatticeWriter. The file is memory
+    mapped, so opening it is O(1) and only the records that are accessed
+    are read. Lattices are rebuilt as instances of cls on access, while
+    sizes, record and leq give the raw data without building objects.
+    '''
+
+    def __init__(self, path: Union[str, Path], cls: Type[T_Lattice] = Lattice):
+        self.path = Path(path)
+        self.cls = cls
+        self._buffer = np.memmap(self.path, dtype=np.uint8, mode='r')
+        magic, version, count, index_offset = _header.unpack_from(
+            self._buffer)
+        assert magic == MAGIC, f'{self.path} is not a lattice file'
+        assert version == FORMAT_VERSION, (
+            f'Unsupported format version {version}')
+        assert index_offset > 0, f'{self.path} was not closed properly'
+        end = index_offset + 4 * count
+        self.sizes = self._buffer[index_offset:end].view('<u4')
+        self.offsets = self._buffer[end:end + 8 * (count + 1)].view('<u8')
+
+    def __len__(self):
+        return len(self.sizes)
+
+    def record(self, i: int) -> memoryview:
+        'packed bits of the i-th lattice'
+        return self._buffer[self.offsets[i]:self.offsets[i + 1]].data
+
+    def leq(self, i: int) -> npBoolMatrix:
+        return record_to_leq(int(self.sizes[i]), self.record(i))
+
+    def lattice_record(self, i: int) -> LatticeRecord:
+        leq = self.leq(i)
+        return LatticeRecord(len(leq), interface.leq_to_bytes(leq))
+
+    def __getitem__(self, i: int) -> T_Lattice:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return self.cls(self.leq(i), check=False)
+
+    def __iter__(self) -> Iterator[T_Lattice]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def of_size(self, n: int) -> Iterator[T_Lattice]:
+        for i in np.flatnonzero(self.sizes == n):
+            yield self[i]
+
+    def close(self):
+        mm = getattr(self._buffer, '_mmap', None)
+        self.sizes = self.offsets = self._buffer = None
+        if mm is not None:
+            mm.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({str(self.path)!r}, n={len(self)})'
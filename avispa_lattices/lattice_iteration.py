@@ -1,12 +1,24 @@
 from __future__ import annotations
+import base64
 from collections import deque
-from typing import TYPE_CHECKING, Optional
+import multiprocessing
+import os
+from pathlib import Path
+import queue
+import tempfile
+from typing import (TYPE_CHECKING, Callable, Dict, FrozenSet, Iterable,
+                    Iterator, List, Optional, Tuple, Union)
 
-from .lattice.lattice import Lattice
+from .lattice.lattice import Lattice, Poset
+from .lattice import downsets, interface, refinement
+from .lattice.poset_index import PosetIndex
+from .lattice.storage import LatticeFile, LatticeRecord, LatticeWriter
+from .utils.cursor import Cursor
+from .utils.numpy_types import npBoolMatrix
+from .utils import _enum as AL_enum
 
 import numpy as np
-from itertools import chain
-from .utils.iterators import cartesian
+from itertools import chain, combinations
 
 
 def _add_edge(self: Lattice, i, j, assume_poset=False):
@@ -36,7 +48,27 @@ def _add_node(self: Lattice, i, j, assume_poset=False):
 
 
 def forbidden_pairs(self: Lattice):
-    "Pairs (i,j) that break lub uniqueness or partial order structure"
+    '''
+    Pairs (a,b) that break lub uniqueness or partial order structure:
+    b <= a, or a and b are incomparable and there exist x <= a and
+    y || a with not b <= y such that lub(x,y) || lub(b,y).
+    '''
+    n = self.n
+    leq = self.leq
+    joi = self.lub
+    nocmp = ~(leq + leq.T)
+    # bad[x,b,y] = lub(x,y) || lub(b,y)
+    bad = nocmp[joi[:, None, :], joi[None, :, :]]
+    # some[a,b,y] = exists x <= a with bad[x,b,y]
+    some = leq.T.astype(np.int64) @ bad.reshape(n, n * n).astype(np.int64)
+    some = some.reshape(n, n, n) > 0
+    some &= nocmp[:, None, :] & ~leq[None, :, :]
+    fb = leq.T | (some.any(axis=2) & ~leq)
+    return fb
+
+
+def forbidden_pairs_bruteforce(self: Lattice):
+    'Reference implementation of forbidden_pairs'
     n = self.n
     leq = self.leq
     joi = self.lub
@@ -55,45 +87,675 @@ def forbidden_pairs(self: Lattice):
     return fb
 
 
-def iter_add_edge(self: Lattice):
-    "Grow self by adding one edge"
+def _pair_leaders(self: Lattice):
+    '''
+    Boolean matrix that is True at (i,j) iff (i,j) is the first pair of
+    its orbit under the automorphisms of self. Isomorphic extensions come
+    from pairs in the same orbit, so only the leaders need to be tried.
+    '''
     n = self.n
+    pairs = np.arange(n * n).reshape(n, n)
+    generators = [pairs[np.ix_(g, g)].ravel()
+                  for g in self.automorphisms.generators]
+    orbit = np.array(refinement.orbits(generators, n * n), dtype=int)
+    return (orbit == np.arange(n * n)).reshape(n, n)
+
+
+def iter_add_edge(self: Lattice):
+    "Grow self by adding one edge, once for each orbit of pairs"
     leq = self.leq
-    fb = forbidden_pairs(self)
-    vis = set()
-    h = self.hash_elems
-    for i, j in cartesian(n, n):
-        if not fb[i, j] and not leq[i, j] and (h[i], h[j]) not in vis:
-            yield _add_edge(self, i, j, assume_poset=True)
+    ok = ~forbidden_pairs(self) & ~leq & _pair_leaders(self)
+    for i, j in np.argwhere(ok):
+        yield _add_edge(self, i, j, assume_poset=True)
     return
 
 
 def iter_add_node(self: Lattice):
-    "Grow self by adding one node"
+    "Grow self by adding one node, once for each orbit of pairs"
+    ok = ~forbidden_pairs(self) & _pair_leaders(self)
+    for i, j in np.argwhere(ok):
+        yield _add_node(self, i, j, assume_poset=True)
+    return
+
+
+def _add_atom(self: Lattice, above: np.ndarray):
+    "Grow self by adding one atom a such that a < x iff above[x]"
     n = self.n
-    fb = forbidden_pairs(self)
-    vis = set()  # Don't repeat isomorphical connections
-    h = self.hash_elems
-    for i, j in cartesian(n, n):
-        if not fb[i, j] and not (h[i], h[j]) in vis:
-            yield _add_node(self, i, j, assume_poset=True)
+    out = np.zeros((n + 1, n + 1), bool)
+    out[:-1, :-1] = self.leq
+    out[n, n] = True
+    out[self.bottom, n] = True
+    out[n, :-1] = above
+    out.flags.writeable = False
+    return self.__class__(out, check=False)
+
+
+def _iter_upsets(P: Lattice, domain: List[int]) -> Iterator[np.ndarray]:
+    'up-sets of P contained in domain, which must be an up-set too'
+    n = P.n
+    U = np.zeros(n, dtype=bool)
+    topo = [x for x in reversed(P.toposort_bottom_up) if x in domain]
+    parents = P.parents
+
+    def rec(i):
+        if i == len(topo):
+            yield U.copy()
+            return
+        x = topo[i]
+        yield from rec(i + 1)
+        if all(U[y] for y in parents[x]):
+            U[x] = True
+            yield from rec(i + 1)
+            U[x] = False
+
+    yield from rec(0)
+
+
+def iter_add_atom(self: Lattice):
+    '''
+    Grow self by adding one atom, once for each orbit of automorphisms.
+
+    Removing an atom from a lattice always leaves a lattice. Conversely,
+    if self has two or more elements, adding an atom a below the elements
+    of a non-empty up-set U (bottom not in U) makes a lattice if and only
+    if U contains the meet of the elements of U above x, for all x other
+    than bottom, because that meet must be the join of a and x.
+    '''
+    n = self.n
+    leq = self.leq
+    if n == 1:
+        yield _add_atom(self, np.zeros(1, dtype=bool))
+        return
+    generators = self._canonization.generators
+    domain = [x for x in range(n) if x != self.bottom]
+    for U in _iter_upsets(self, domain):
+        if not U.any():
+            continue
+        meets = [self.glb_of_many(np.flatnonzero(U & leq[x, :]))
+                 for x in domain]
+        if not U[meets].all():
+            continue
+        if not _is_orbit_minimum(U, generators):
+            continue
+        yield _add_atom(self, U)
+    return
+
+
+def _is_orbit_minimum(U: np.ndarray, generators: List[List[int]]):
+    '''
+    Whether the set U, as the number sum(2**x for x in U), is the smallest
+    of its orbit under the group generated by generators. The orbit is
+    explored breadth first, stopping at the first smaller set.
+    '''
+    weight = lambda V: int.from_bytes(
+        np.packbits(V, bitorder='little').tobytes(), 'little')
+    w = weight(U)
+    seen = {w}
+    queue = deque([U])
+    while queue:
+        V = queue.popleft()
+        for g in generators:
+            W = np.empty_like(V)
+            W[g] = V
+            w_W = weight(W)
+            if w_W < w:
+                return False
+            if w_W not in seen:
+                seen.add(w_W)
+                queue.append(W)
+    return True
+
+
+def _is_canonical_atom(self: Lattice, a: int):
+    '''
+    Whether a is in the same orbit as the atom that comes first in the
+    canonical labeling of self, i.e. whether removing a is the canonical
+    way of reducing self.
+    '''
+    rank, _, generators, _ = self._canonization
+    orbit = refinement.orbits(generators, self.n)
+    first = min(self.parents[self.bottom], key=lambda x: rank[x])
+    return orbit[a] == orbit[first]
+
+
+def _iter_augmentation(L: Lattice, max_size: int) -> Iterator[Lattice]:
+    'L and its descendants in the tree of canonical augmentations'
+    yield L
+    if L.n < max_size:
+        for V in iter_add_atom(L):
+            if _is_canonical_atom(V, L.n):
+                yield from _iter_augmentation(V, max_size)
     return
 
 
 def iter_all_lattices(max_size: int,
-                      starting_lattice: Optional[Lattice] = None):
-    q: deque[Lattice]
+                      starting_lattice: Optional[Lattice] = None,
+                      cursor: Optional[Cursor] = None,
+                      method: AL_enum.iter_all_lattices_method = 'BFS',
+                      compact: bool = False):
+    '''
+    All lattices (up to isomorphism) of size up to max_size, as
+    LatticeRecord objects if compact is True.
+
+    method='BFS' grows lattices by adding edges and nodes, and discards
+    the isomorphic copies with a global visited index. Both the queue and
+    the index only keep packed bits, and each lattice is rebuilt when it
+    is popped, so no Lattice objects accumulate during the search.
+    See help(Cursor) for checkpoint and resume.
+
+    method='augmentation' grows lattices by adding atoms, in depth first
+    order, and keeps a lattice only if the new atom is the canonical one
+    to remove (McKay's canonical augmentation). Each lattice is produced
+    exactly once without storing the visited ones, so memory is
+    proportional to max_size. starting_lattice and cursor are not
+    supported.
+    '''
+    if compact:
+        output = lambda L: LatticeRecord.from_lattice(L.canonical)
+    else:
+        output = lambda L: L.canonical
+    if method == 'augmentation':
+        assert starting_lattice is None and cursor is None, (
+            'starting_lattice and cursor are not supported by augmentation')
+        if max_size >= 0:
+            yield output(Lattice.from_children([]))
+        if max_size >= 1:
+            root = Lattice.from_children([[]])
+            for U in _iter_augmentation(root, max_size):
+                yield output(U)
+        return
+    elif method != 'BFS':
+        raise NotImplementedError(
+            f'"{method}" not in {AL_enum.iter_all_lattices_methods}')
+    # The queue only keeps packed records, the lattices are rebuilt on pop
+    q: deque[LatticeRecord]
     if starting_lattice is None:
-        q = deque([Lattice.from_children(x) for x in [[], [[]], [[], [0]]]])
+        start = [Lattice.from_children(x) for x in [[], [[]], [[], [0]]]]
     else:
-        q = deque([starting_lattice])
-    vis = set()
+        start = [starting_lattice]
+    q = deque(map(LatticeRecord.from_lattice, start))
+    vis = PosetIndex(Lattice)
+    if cursor is not None:
+        snapshot = lambda: {
+            'queue': [_encode(U) for U in q],
+            'visited': [_encode(U) for U in vis],
+        }
+        signature = (max_size, starting_lattice and starting_lattice.leq)
+        resume = cursor.attach('iter_all_lattices',
+                               Cursor.signature(*signature), snapshot)
+        if resume is not None:
+            q = deque(LatticeRecord.from_lattice(_decode(x))
+                      for x in resume['queue'])
+            vis = PosetIndex(Lattice, (_decode(x) for x in resume['visited']))
     while q:
-        U = q.popleft()
-        yield U.canonical
+        U = q.popleft().to_lattice()
         it = iter_add_node(U) if U.n < max_size else iter([])
         for V in chain(iter_add_edge(U), it):
-            if V not in vis:
-                vis.add(V)
-                q.append(V)
+            if vis.add(V):
+                q.append(LatticeRecord.from_lattice(V))
+        yield output(U)
+    return
+
+
+def _add_maximal(self: Poset, below: np.ndarray):
+    "Grow self by adding one maximal element m such that x < m iff below[x]"
+    n = self.n
+    out = np.zeros((n + 1, n + 1), bool)
+    out[:-1, :-1] = self.leq
+    out[n, n] = True
+    out[:-1, n] = below
+    out.flags.writeable = False
+    return self.__class__(out, check=False)
+
+
+def _is_canonical_maximal(self: Poset, m: int):
+    '''
+    Whether m is in the same orbit as the canonical maximal element of
+    self: among the maximal elements with the most elements below and
+    then the largest element hash, the one that comes last in the
+    canonical labeling. The first two criteria usually leave only one
+    element, and then the canonical labeling is not needed.
+    '''
+    leq = self.leq
+    tops = np.flatnonzero(leq.sum(axis=1) == 1)
+    below = leq[:, tops].sum(axis=0)
+    candidates = tops[below == below.max()]
+    if m not in candidates:
+        return False
+    if len(candidates) == 1:
+        return True
+    h = self.hash_elems
+    best = max(h[x] for x in candidates)
+    if h[m] != best:
+        return False
+    candidates = [x for x in candidates if h[x] == best]
+    if len(candidates) == 1:
+        return True
+    rank, _, generators, _ = self._canonization
+    orbit = refinement.orbits(generators, self.n)
+    last = max(candidates, key=lambda x: rank[x])
+    return orbit[m] == orbit[last]
+
+
+def _iter_poset_augmentation(
+        P: Poset, max_size: int,
+        prune: Optional[Callable[[Poset], bool]] = None) -> Iterator[Poset]:
+    '''
+    P and its descendants in the tree of canonical augmentations, where
+    each child adds a maximal element above a down-set of its parent.
+    The children of the same parent are isomorphic only if their
+    down-sets are in the same orbit, so they are deduplicated locally.
+    Children for which prune is True are skipped with their subtrees,
+    so prune must hold for all the posets that contain a pruned one.
+    '''
+    yield P
+    if P.n >= max_size:
+        return
+    siblings: Dict[int, List[Poset]] = {}
+    for D in downsets.iter_downsets(P):
+        Q = _add_maximal(P, D)
+        if prune is not None and prune(Q):
+            continue
+        if not _is_canonical_maximal(Q, P.n):
+            continue
+        same_hash = siblings.setdefault(Q.hash, [])
+        if not any(Q == other for other in same_hash):
+            same_hash.append(Q)
+            yield from _iter_poset_augmentation(Q, max_size, prune)
+    return
+
+
+def iter_all_posets(n: int) -> Iterator[Poset]:
+    '''
+    All posets (up to isomorphism) of size n, in canonical form, streamed
+    in depth first order. Each poset is produced exactly once by the
+    canonical augmentation of _iter_poset_augmentation, so nothing is
+    stored besides the current branch and the siblings of each node.
+    '''
+    root = Poset.from_children([])
+    for P in _iter_poset_augmentation(root, n):
+        if P.n == n:
+            yield Poset(P._canonization.leq, check=False)
+    return
+
+
+def iter_distributive_lattices(n: int) -> Iterator[Lattice]:
+    '''
+    All distributive lattices (up to isomorphism) of size n, as lattices
+    of down-sets of posets (Birkhoff's representation). The posets are
+    generated up to isomorphism by canonical augmentation, and pruned as
+    soon as they have more than n down-sets, which never decreases when
+    adding elements.
+    '''
+    if n == 0:
+        yield Lattice.from_children([])
+        return
+    count = lambda P: downsets.count_downsets(P, n)
+    root = Poset.from_children([])
+    for P in _iter_poset_augmentation(root, n - 1, lambda P: count(P) > n):
+        if count(P) == n:
+            yield downsets.downset_lattice(P, Lattice).canonical
+    return
+
+
+def _iter_clique_partitions(edges: FrozenSet[Tuple[int, int]],
+                            limit: int) -> Iterator[List[List[int]]]:
+    '''
+    Partitions of the edges (i, j), i < j, into at most limit cliques. The
+    first edge goes to each clique of the remaining edges that contains it.
+    '''
+    if not edges:
+        yield []
+        return
+    if limit == 0:
+        return
+    u, v = min(edges)
+    common = sorted(w for a, w in edges if a == v and (u, w) in edges)
+    for size in range(len(common) + 1):
+        for extra in combinations(common, size):
+            if not all(pair in edges for pair in combinations(extra, 2)):
+                continue
+            clique = [u, v, *extra]
+            rest = edges.difference(combinations(clique, 2))
+            for partition in _iter_clique_partitions(rest, limit - 1):
+                yield [clique, *partition]
+    return
+
+
+def _iter_counts(minimum: List[int], total: int) -> Iterator[List[int]]:
+    'Lists c with c[i] >= minimum[i] for all i and sum(c) == total'
+    if not minimum:
+        if total == 0:
+            yield []
+        return
+    for c in range(minimum[0], total - sum(minimum[1:]) + 1):
+        for rest in _iter_counts(minimum[1:], total - c):
+            yield [c, *rest]
+    return
+
+
+def _rank_excess(leq: npBoolMatrix, rank: np.ndarray):
+    '''
+    rank[i] + rank[j] - rank[lub(i,j)] - rank[glb(i,j)] and lub, or None
+    if leq is not a lattice. leq must be upper triangular.
+    '''
+    n = len(leq)
+    up = leq[:, None, :] & leq[None, :, :]
+    down = leq.T[:, None, ::-1] & leq.T[None, :, ::-1]
+    lub = np.argmax(up, axis=2)
+    glb = n - 1 - np.argmax(down, axis=2)
+    if not (leq[lub] | ~up).all() or not (leq.T[glb] | ~down[:, :, ::-1]).all():
+        return None
+    return rank[:, None] + rank[None, :] - rank[lub] - rank[glb], lub
+
+
+def _iter_modular_truncations(
+        leq: npBoolMatrix, rank: np.ndarray,
+        max_size: int) -> Iterator[Tuple[npBoolMatrix, np.ndarray]]:
+    '''
+    leq and its descendants in the tree of graded lattices whose parent
+    is the truncation below the coatoms (the coatoms are removed and the
+    elements of lower rank are kept with the top). A truncation of a
+    modular lattice is semimodular (submodular rank) and satisfies the
+    modular equality for the pairs whose join is not the top, and so are
+    all its truncations, so the nodes without this property are pruned.
+
+    The parent is unique, so only the children of the same node need to
+    be deduplicated. A child replaces the top by a new level, where each
+    new element covers a set of coatoms. Two coatoms whose meet has rank
+    h-2 must be below exactly one new element and the others below none,
+    so the sets with two or more coatoms are a partition into cliques of
+    the edges of that graph, and the rest are single coatoms.
+    '''
+    yield leq, rank
+    n = len(leq)
+    h = rank[-1]
+    coatoms = np.flatnonzero(rank == h - 1)
+    down = leq[:, None, coatoms] & leq[:, coatoms, None]
+    meet = n - 1 - np.argmax(down[::-1], axis=0)
+    adjacent = np.triu(rank[meet] == h - 2, 1)
+    edges = frozenset(map(tuple, np.argwhere(adjacent).tolist()))
+    seen = set()
+    for cliques in _iter_clique_partitions(edges, max_size - n):
+        minimum = [1] * len(coatoms)
+        for c in chain(*cliques):
+            minimum[c] = 0
+        for s in range(sum(minimum), max_size - n - len(cliques) + 1):
+            for counts in _iter_counts(minimum, s):
+                covers = [*cliques, *([c] for c, k in enumerate(counts)
+                                      for _ in range(k))]
+                m = len(covers)
+                child = np.zeros((n + m, n + m), dtype=bool)
+                child[:n - 1, :n - 1] = leq[:n - 1, :n - 1]
+                for y, cover in enumerate(covers, n - 1):
+                    child[:n - 1, y] = leq[:n - 1, coatoms[cover]].any(axis=1)
+                    child[y, y] = True
+                child[:, -1] = True
+                child_rank = np.concatenate([rank[:-1], [h] * m, [h + 1]])
+                excess = _rank_excess(child, child_rank)
+                if excess is None:
+                    continue
+                excess, lub = excess
+                if (excess < 0).any() or excess[lub != n + m - 1].any():
+                    continue
+                key = refinement.canonize(child).leq.tobytes()
+                if key in seen:
+                    continue
+                seen.add(key)
+                child.flags.writeable = False
+                yield from _iter_modular_truncations(child, child_rank,
+                                                     max_size)
+    return
+
+
+def iter_modular_lattices(n: int) -> Iterator[Lattice]:
+    '''
+    All modular lattices (up to isomorphism) of size n, grown level by
+    level as graded lattices (see _iter_modular_truncations). Only the
+    subtrees that can contain modular lattices are explored.
+    '''
+    if n <= 1:
+        yield Lattice.from_children([[]] * n)
+        return
+    leq = np.array([[True, True], [False, True]])
+    leq.flags.writeable = False
+    for leq, rank in _iter_modular_truncations(leq, np.arange(2), n):
+        if len(leq) == n and not _rank_excess(leq, rank)[0].any():
+            yield Lattice(leq, check=False).canonical
+    return
+
+
+LATTICE_PROPERTIES = ('distributive', 'modular', 'graded', 'complemented')
+
+
+def lattice_properties(leq: npBoolMatrix) -> Dict[str, bool]:
+    '''
+    Properties of the lattice leq, computed with array operations only.
+    The labeling of leq must be a linear extension (leq upper triangular,
+    e.g. a canonical form), so that lub[i,j] is the first common upper
+    bound and glb[i,j] the last common lower bound.
+    '''
+    n = len(leq)
+    if n == 0:
+        return dict.fromkeys(LATTICE_PROPERTIES, True)
+    up = leq[:, None, :] & leq[None, :, :]
+    down = leq.T[:, None, ::-1] & leq.T[None, :, ::-1]
+    lub = np.argmax(up, axis=2)
+    glb = n - 1 - np.argmax(down, axis=2)
+    distributive = (glb[:, lub] == lub[glb[:, :, None], glb[:, None, :]]).all()
+    # leq[i,k] implies lub(i, glb(j,k)) == glb(lub(i,j), k)
+    modular = (~leq[:, None, :] | (lub[:, glb] == glb[lub[:, :, None],
+                                                     np.arange(n)])).all()
+    lt = leq & ~np.eye(n, dtype=bool)
+    cover = lt & ~(lt.astype(np.int64) @ lt.astype(np.int64) > 0)
+    height = np.zeros(n, dtype=np.int64)
+    for y in range(1, n):
+        height[y] = height[cover[:, y]].max() + 1
+    graded = (height[None, :] == height[:, None] + 1)[cover].all()
+    complemented = ((lub == n - 1) & (glb == 0)).any(axis=1).all()
+    return {
+        'distributive': bool(distributive),
+        'modular': bool(modular),
+        'graded': bool(graded),
+        'complemented': bool(complemented),
+    }
+
+
+def count_lattices(leqs: Iterable[npBoolMatrix]) -> Dict[int, Dict[str, int]]:
+    '''
+    Number of lattices of each size, in total and with each property of
+    lattice_properties. Each leq must be upper triangular.
+    '''
+    counts: Dict[int, Dict[str, int]] = {}
+    for leq in leqs:
+        n = len(leq)
+        if n not in counts:
+            counts[n] = dict.fromkeys(('total', *LATTICE_PROPERTIES), 0)
+        c = counts[n]
+        c['total'] += 1
+        for key, value in lattice_properties(leq).items():
+            c[key] += value
+    return dict(sorted(counts.items()))
+
+
+def count_all_lattices(max_size: int) -> Dict[int, Dict[str, int]]:
+    '''
+    count_lattices of all the lattices of size up to max_size, e.g.
+        count_all_lattices(7)[6] == {'total': 15, 'distributive': 5,
+            'modular': 8, 'graded': 9, 'complemented': 6}.
+    The lattices are generated by canonical augmentation, as in
+    iter_all_lattices, but the only objects kept are the ones in the
+    current branch of the search, and the counts use the canonical
+    matrices that the augmentation computes anyway.
+    '''
+    def leqs():
+        if max_size >= 0:
+            yield np.zeros((0, 0), dtype=bool)
+        if max_size >= 1:
+            root = Lattice.from_children([[]])
+            for U in _iter_augmentation(root, max_size):
+                yield U._canonization.leq
+
+    return count_lattices(leqs())
+
+
+def _augmentation_shard(args):
+    '''
+    Canonical packed bits of at most chunk_size lattices below a seed, in
+    depth first order, and the tasks for the subtrees that were not
+    explored yet (runs in a worker)
+    '''
+    n, data, max_size, chunk_size = args
+    stack = [Lattice(interface.bytes_to_leq(n, data), check=False)]
+    found = []
+    while stack and len(found) < chunk_size:
+        U = stack.pop()
+        found.append((U.n, interface.leq_to_bytes(U.canonical.leq)))
+        if U.n < max_size:
+            stack.extend(V for V in iter_add_atom(U)
+                         if _is_canonical_atom(V, U.n))
+    rest = [(U.n, interface.leq_to_bytes(U.leq), max_size, chunk_size)
+            for U in stack]
+    return found, rest
+
+
+def iter_all_lattices_parallel(max_size: int, processes: Optional[int] = None,
+                               seed_size: Optional[int] = None,
+                               compact: bool = False,
+                               chunk_size: int = 10000):
+    '''
+    All lattices (up to isomorphism) of size up to max_size, computed by
+    a pool of processes, in no particular order. If compact is True,
+    LatticeRecord objects are yielded instead, and the results of the
+    workers are never turned into Lattice objects.
+
+    The tree of canonical augmentations (see iter_all_lattices) is
+    generated up to seed_size in this process, and each lattice of size
+    seed_size is a shard whose subtree is enumerated by workers. The
+    subtrees are disjoint, so workers need no shared visited set and
+    send no keys to each other. By default, seed_size is
+    min(max_size, 8), giving 222 shards.
+
+    A task returns at most chunk_size lattices, together with the
+    unexplored branches of its subtree, which become new tasks. At most
+    2 * processes tasks are running or waiting to be consumed, so the
+    memory of the workers and of this process is bounded by chunk_size
+    (plus the pending branches), not by the size of the subtrees.
+    '''
+    if compact:
+        output = lambda L: LatticeRecord.from_lattice(L)
+    else:
+        output = lambda L: L
+    if max_size >= 0:
+        yield output(Lattice.from_children([]))
+    if max_size < 1:
+        return
+    if seed_size is None:
+        seed_size = min(max_size, 8)
+    assert 1 <= seed_size <= max_size, (seed_size, max_size)
+    assert chunk_size >= 1, chunk_size
+    tasks = []
+    for U in _iter_augmentation(Lattice.from_children([[]]), seed_size):
+        if U.n < seed_size:
+            yield output(U.canonical)
+        else:
+            tasks.append(
+                (U.n, interface.leq_to_bytes(U.leq), max_size, chunk_size))
+    tasks.reverse()  # popped in generation order
+    results: queue.SimpleQueue = queue.SimpleQueue()
+    limit = 2 * (processes or os.cpu_count() or 1)
+    with multiprocessing.Pool(processes) as pool:
+        running = 0
+        while tasks or running:
+            while tasks and running < limit:
+                pool.apply_async(_augmentation_shard, (tasks.pop(),),
+                                 callback=results.put,
+                                 error_callback=results.put)
+                running += 1
+            result = results.get()
+            running -= 1
+            if isinstance(result, BaseException):
+                raise result
+            found, rest = result
+            tasks.extend(rest)
+            for n, data in found:
+                if compact:
+                    yield LatticeRecord(n, data)
+                else:
+                    leq = interface.bytes_to_leq(n, data)
+                    yield Lattice(leq, check=False)
+    return
+
+
+def _spill_level(directory: Path, k: int, buffer_size: int) -> Path:
+    '''
+    Write the lattices of size k to directory, from the file of size k-1,
+    unless the file already exists. The file is written under a temporary
+    name and renamed when complete, so an interrupted run leaves no
+    partial level behind.
+    '''
+    path = directory / f'lattices_{k}.bin'
+    if path.exists():
+        return path
+    tmp = path.with_name(f'{path.name}.tmp')
+    with LatticeWriter(tmp, buffer_size) as writer:
+        if k <= 1:
+            writer.append(Lattice.from_children([[]] * k))
+        else:
+            with LatticeFile(directory / f'lattices_{k-1}.bin') as parents:
+                for L in parents:
+                    for V in iter_add_atom(L):
+                        if _is_canonical_atom(V, L.n):
+                            writer.append(V)
+    os.replace(tmp, path)
+    return path
+
+
+def iter_all_lattices_by_level(max_size: int,
+                               directory: Optional[Union[str, Path]] = None,
+                               buffer_size: int = 2**20,
+                               compact: bool = False):
+    '''
+    All lattices (up to isomorphism) of size up to max_size, level by
+    level, with memory bounded by a single lattice plus the file buffers.
+
+    Each size k is finished and spilled to directory/lattices_{k}.bin
+    (see LatticeWriter) before size k+1 is generated from it, by adding
+    one atom to each lattice of size k and keeping the canonical
+    augmentations (see iter_all_lattices). These are all distinct, so no
+    level is ever kept in memory for deduplication. The lattices of each
+    level are streamed back from its file once it is complete.
+
+    If directory is given, existing level files are reused, so an
+    interrupted run resumes at the first missing level. Otherwise, a
+    temporary directory is used and deleted at the end.
+    If compact is True, LatticeRecord objects are yielded instead.
+    '''
+    if directory is None:
+        with tempfile.TemporaryDirectory() as tmp:
+            yield from iter_all_lattices_by_level(max_size, tmp, buffer_size,
+                                                  compact)
+        return
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    for k in range(max_size + 1):
+        path = _spill_level(directory, k, buffer_size)
+        with LatticeFile(path) as level:
+            if compact:
+                for i in range(len(level)):
+                    yield level.lattice_record(i)
+            else:
+                yield from level
     return
+
+
+def _encode(L: Union[Lattice, LatticeRecord]):
+    'JSON friendly representation of L'
+    return [L.n, base64.b64encode(interface.leq_to_bytes(L.leq)).decode()]
+
+
+def _decode(obj) -> Lattice:
+    'inverse of _encode'
+    n, data = obj
+    leq = interface.bytes_to_leq(n, base64.b64decode(data))
+    return Lattice(leq, check=False)
@@ -2,8 +2,11 @@ import numpy as np
 from ..utils.random_state import AL_random
 
 
-def random_lattice(n: int):
+def random_lattice_original(n: int):
     '''
+    Straight port of the original algorithm, kept as a reference for
+    random_lattice, which gives the same output for the same seed.
+
     Description:
     
         http://ka.karlin.mff.cuni.cz/jezek/093/random.pdf
@@ -104,4 +107,63 @@ def random_lattice(n: int):
     for i in range(n):
         Work(i)
 
-    return J
\ No newline at end of file
+    return J
+
+
+def random_lattice(n: int):
+    '''
+    Same algorithm and same output as random_lattice_original, with the
+    loops of FindMax and Work replaced by array operations.
+
+    J[a, b] is the lub of a and b if it is known, and -1 otherwise.
+    Step i finds the set S of elements below i, as the closure of the
+    randomly chosen maximal elements under going down and taking lubs,
+    and then sets i as the lub of the pairs in S without one.
+    The random numbers are drawn in the same order as in the original,
+    and the arrays M and Q keep their values across steps as there.
+    '''
+    J = np.full((n, n), -1, dtype=int)
+    J[np.diag_indices(n)] = np.arange(n)
+    M = np.zeros((n,), dtype=np.int64)
+    Q = np.zeros((n,), dtype=np.int64)
+
+    def FindMax(i: int):
+        sub = J[:i, :i]
+        above = (sub == np.arange(i)[:, None]) & ~np.eye(i, dtype=bool)
+        found = np.flatnonzero(~above.any(axis=0))
+        M[:len(found)] = found
+        k = max(len(found), 1)
+        a = AL_random.randint(0, k) + 1
+        Q[:k] = 0
+        Q[AL_random.randint(0, k, size=a)] = 1
+        return k
+
+    for i in range(n - 1):
+        q = max(2, int(np.ceil(np.sqrt(n - i))))
+        if i == 1:
+            u = 1
+            M[0] = 0
+            Q[0] = 1
+        elif AL_random.randint(0, q) == 0:
+            u = FindMax(i)
+        else:
+            u = 1
+        chosen = M[:u][Q[:u] != 0]
+        S = np.zeros(i, dtype=bool)
+        S[chosen[chosen < i]] = True  # at i == 0, M[0] is i itself
+        sub = J[:i, :i]
+        leq = sub == np.arange(i)[None, :]
+        while True:
+            new = S | leq[:, S].any(axis=1)
+            lubs = sub[np.ix_(new, new)]
+            new[lubs[lubs != -1]] = True
+            if (new == S).all():
+                break
+            S = new
+        idx = np.flatnonzero(S)
+        J[idx, i] = i
+        J[i, idx] = i
+        block = J[np.ix_(idx, idx)]
+        J[np.ix_(idx, idx)] = np.where(block == -1, i, block)
+    J[J == -1] = n - 1
+    return J
@@ -0,0 +1,104 @@
+from itertools import islice
+import numpy as np
+from .. import AL
+from ..lattice import identity
+from ..function_iteration import (
+    f_iter_lub_bruteforce,
+    f_iter_lub_pruned,
+    f_iter_monotones_poset_bruteforce,
+)
+
+
+def test_f_iter_lub_pruned():
+    for L in AL.iter_all_lattices(6):
+        for bottom_to_bottom in [True, False]:
+            expected = list(f_iter_lub_bruteforce(L, bottom_to_bottom))
+            found = list(f_iter_lub_pruned(L, bottom_to_bottom))
+            assert len(found) == len(set(map(tuple, found)))
+            assert sorted(expected) == sorted(found), L
+
+
+def test_f_iter_monotones_poset():
+    AL.random.seed(0)
+    for n in range(7):
+        P = AL.random_poset(n, 0.3)
+        expected = list(f_iter_monotones_poset_bruteforce(P))
+        found = list(P.f_iter_monotones())
+        assert sorted(expected) == sorted(found), P
+        assert P.f_count_monotones() == len(expected), P
+        chunks = P.f_iter_monotones_chunks(chunk_size=10)
+        assert [list(f) for chunk in chunks for f in chunk] == found
+
+
+def test_f_rank_monotone():
+    AL.random.seed(1)
+    lattices = [AL.random_lattice(n) for n in range(1, 8)]
+    # Labels that are not in topological order (bottom is not 0)
+    lattices.append(AL.Lattice.from_children([[2], [2], [], [0, 1]]))
+    lattices += [L.reindex(list(AL.random.permutation(L.n)))
+                 for L in lattices[2:]]
+    for L in lattices:
+        for bottom_to_bottom in [True, False]:
+            found = list(L.f_iter_monotones(bottom_to_bottom))
+            assert L.f_count_monotones(bottom_to_bottom) == len(found)
+            for k, f in enumerate(found):
+                assert L.f_rank_monotone(f, bottom_to_bottom) == k
+                assert L.f_unrank_monotone(k, bottom_to_bottom) == f
+            k = len(found) // 3
+            cursor = L.f_monotones_cursor(k, bottom_to_bottom)
+            it = L.f_iter_monotones(bottom_to_bottom, cursor=cursor)
+            assert list(it) == found[k:]
+
+
+def test_f_iter_orbits():
+    for L in AL.iter_all_lattices(6):
+        auts = list(identity.iter_isomorphisms(L, L))
+        for bottom_to_bottom in [True, False]:
+            for method in [L.f_iter_monotones, L.f_iter_lub]:
+                expected = set(map(tuple, method(bottom_to_bottom)))
+                found = set()
+                orbits = getattr(L, f'{method.__name__}_orbits')
+                for f, size in orbits(bottom_to_bottom):
+                    orbit = {tuple(s[f[i]] for i in np.argsort(s))
+                             for s in auts}
+                    assert len(orbit) == size and not orbit & found
+                    found |= orbit
+                assert found == expected, L
+    # Large automorphism groups: M_8 has 8! automorphisms
+    M8 = AL.Lattice.from_children([[]] + [[0]] * 8 + [list(range(1, 9))])
+    orbits = list(M8.f_iter_lub_orbits())
+    assert len(orbits) == 190
+    assert sum(size for _, size in orbits) == 1441810
+
+
+def _interrupted(enumeration, stops):
+    'run enumeration(cursor) stopping and resuming at each stop'
+    found = []
+    state = None
+    for stop in [*stops, None]:
+        cursor = AL.Cursor() if state is None else AL.Cursor.loads(state)
+        found.extend(islice(enumeration(cursor), stop))
+        state = cursor.dumps()
+    return found
+
+
+def test_cursor_resume():
+    AL.random.seed(5)
+    L = AL.random_lattice(7)
+    stops = [0, 1, 7, 50, 3]
+    for method in [L.f_iter_monotones, L.f_iter_lub]:
+        expected = list(method())
+        found = _interrupted(lambda cursor: method(cursor=cursor), stops)
+        assert found == expected
+    expected = [L.name for L in AL.iter_all_lattices(6)]
+    found = _interrupted(lambda cursor: AL.iter_all_lattices(6, cursor=cursor),
+                         stops)
+    assert [L.name for L in found] == expected
+
+
+if __name__ == '__main__':
+    test_f_iter_lub_pruned()
+    test_f_iter_monotones_poset()
+    test_f_rank_monotone()
+    test_f_iter_orbits()
+    test_cursor_resume()
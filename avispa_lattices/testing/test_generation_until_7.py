@@ -1,4 +1,16 @@
+from pathlib import Path
+import tempfile
 from .. import AL
+import numpy as np
+from ..lattice_iteration import (
+    _add_edge,
+    _add_node,
+    forbidden_pairs,
+    forbidden_pairs_bruteforce,
+    iter_add_atom,
+    iter_add_edge,
+    iter_add_node,
+)
 
 
 def test_generation_until_7():
@@ -18,5 +30,138 @@ def test_generation_until_7():
     assert len(non_mod) == 45
 
 
+def test_count_until_9():
+    counts = AL.count_all_lattices(9)
+    total = [counts[n]['total'] for n in range(10)]
+    assert total == [1, 1, 1, 1, 2, 5, 15, 53, 222, 1078]
+    dist = [counts[n]['distributive'] for n in range(10)]
+    assert dist == [1, 1, 1, 1, 2, 3, 5, 8, 15, 26]
+    mod = [counts[n]['modular'] for n in range(10)]
+    assert mod == [1, 1, 1, 1, 2, 4, 8, 16, 34, 72]
+    expected = {}
+    for L in AL.iter_all_lattices(7):
+        if L.n == 0:
+            continue
+        c = expected.setdefault(L.n, dict.fromkeys(counts[0], 0))
+        c['total'] += 1
+        c['distributive'] += L.is_distributive
+        c['modular'] += L.is_modular
+        c['graded'] += len({len(chain) for chain in _maximal_chains(L)}) == 1
+        c['complemented'] += all(
+            any(L.lub[x, y] == L.top and L.glb[x, y] == L.bottom
+                for y in range(L.n)) for x in range(L.n))
+    assert all(expected[n] == counts[n] for n in range(1, 8))
+
+
+def _maximal_chains(L):
+    'maximal chains of L as lists of elements from top to bottom'
+    stack = [[L.top]]
+    while stack:
+        chain = stack.pop()
+        children = L.children[chain[-1]]
+        if not children:
+            yield chain
+        stack.extend([*chain, c] for c in children)
+
+
+def test_augmentation_until_8():
+    found = [L.canonical.leq.tobytes()
+             for L in AL.iter_all_lattices(8, method='augmentation')]
+    expected = {L.canonical.leq.tobytes() for L in AL.iter_all_lattices(8)}
+    assert len(found) == len(set(found)) == 301
+    assert set(found) == expected
+    # M_10 has 10! automorphisms but only 11 orbits of valid up-sets
+    M10 = AL.Lattice.from_children([[]] + [[0]] * 10 + [list(range(1, 11))])
+    assert len(list(iter_add_atom(M10))) == 11
+
+
+def test_parallel_until_8():
+    expected = {L.canonical.leq.tobytes() for L in AL.iter_all_lattices(8)}
+    for seed_size in [1, 5, None]:
+        found = [L.leq.tobytes()
+                 for L in AL.iter_all_lattices_parallel(8, 2, seed_size)]
+        assert len(found) == 301 and set(found) == expected
+    # Small chunks split the subtrees into many tasks
+    found = [L.leq.tobytes()
+             for L in AL.iter_all_lattices_parallel(8, 2, 3, chunk_size=7)]
+    assert len(found) == 301 and set(found) == expected
+
+
+def test_by_level_until_8():
+    expected = [L.canonical.leq.tobytes() for L in
+                AL.iter_all_lattices(8, method='augmentation')]
+    with tempfile.TemporaryDirectory() as tmp:
+        found = [L.leq.tobytes()
+                 for L in AL.iter_all_lattices_by_level(8, tmp, 64)]
+        assert [len(x) for x in found] == sorted(len(x) for x in expected)
+        assert sorted(found) == sorted(expected)
+        # Resume after losing the last level
+        (Path(tmp) / 'lattices_8.bin').unlink()
+        resumed = [L.leq.tobytes() for L in AL.iter_all_lattices_by_level(8, tmp)]
+        assert resumed == found
+
+
+def test_distributive_and_modular():
+    key = lambda L: L.canonical.leq.tobytes()
+    lattices = list(AL.iter_all_lattices(8))
+    for n in range(9):
+        dist = {key(L) for L in lattices if L.n == n and L.is_distributive}
+        mod = {key(L) for L in lattices if L.n == n and L.is_modular}
+        found = list(map(key, AL.iter_distributive_lattices(n)))
+        assert len(found) == len(dist) and set(found) == dist
+        found = list(map(key, AL.iter_modular_lattices(n)))
+        assert len(found) == len(mod) and set(found) == mod
+    counts = [len(list(AL.iter_distributive_lattices(n))) for n in range(14)]
+    assert counts[9:] == [26, 47, 82, 151, 269]
+    counts = [len(list(AL.iter_modular_lattices(n))) for n in range(12)]
+    assert counts[9:] == [72, 157, 343]
+
+
+def test_all_posets():
+    counts = [len(list(AL.iter_all_posets(n))) for n in range(8)]
+    assert counts == [1, 1, 2, 5, 16, 63, 318, 2045]
+    AL.random.seed(1)
+    for n in range(7):
+        found = [P.leq.tobytes() for P in AL.iter_all_posets(n)]
+        assert len(set(found)) == len(found)
+        for _ in range(20):
+            P = AL.random_poset(n, AL.random.rand())
+            assert P.canonical.leq.tobytes() in found
+
+
+def test_forbidden_pairs():
+    AL.random.seed(0)
+    lattices = [AL.random_lattice(n) for n in range(12) for _ in range(5)]
+    for L in [*AL.iter_all_lattices(6), *lattices]:
+        expected = forbidden_pairs_bruteforce(L)
+        assert (forbidden_pairs(L) == expected).all(), L
+
+
+def test_iter_add_orbits():
+    # Pruned extensions must reach the same isomorphism classes
+    key = lambda L: L.canonical.leq.tobytes()
+    for L in AL.iter_all_lattices(6):
+        fb = forbidden_pairs(L)
+        edges = [_add_edge(L, i, j) for i, j in np.argwhere(~fb & ~L.leq)]
+        nodes = [_add_node(L, i, j) for i, j in np.argwhere(~fb)]
+        found = list(iter_add_edge(L))
+        assert len(found) <= len(edges)
+        assert set(map(key, found)) == set(map(key, edges))
+        found = list(iter_add_node(L))
+        assert len(found) <= len(nodes)
+        assert set(map(key, found)) == set(map(key, nodes))
+    boolean = AL.Lattice.from_children([[], [0], [0], [0], [1, 2], [1, 3],
+                                        [2, 3], [4, 5, 6]])
+    assert len(list(iter_add_node(boolean))) == 7
+
+
 if __name__ == '__main__':
     test_generation_until_7()
+    test_count_until_9()
+    test_augmentation_until_8()
+    test_parallel_until_8()
+    test_by_level_until_8()
+    test_distributive_and_modular()
+    test_all_posets()
+    test_forbidden_pairs()
+    test_iter_add_orbits()
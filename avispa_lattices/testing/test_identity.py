@@ -0,0 +1,154 @@
+import itertools
+import time
+import numpy as np
+from .. import AL
+from ..lattice import graph, identity
+
+
+def test_hash_versions():
+    L = AL.Lattice.from_children([[], [0], [0], [1], [1, 2], [3, 4]])
+    # Hashes must be consistent across runs and versions must not change
+    assert identity.hash_poset(L, version=1) == 6878133716673486463
+    assert identity.hash_poset(L, version=2) == 2383582846854711794
+    assert L.hash == identity.hash_poset(L, version=identity.HASH_VERSION)
+    # Version 1 must not depend on how numpy prints its scalars
+    ints = [3, -5, 2**62]
+    expected = identity.hasher_v1(ints)
+    assert identity.hasher_v1(np.array(ints, dtype=np.int64).tolist()) == expected
+    assert identity.hasher_v1(list(np.array(ints, dtype=np.int64))) == expected
+    # Fingerprints must never change
+    assert L.fingerprint(version=1) == 6878133716673486463
+    assert L.fingerprint(version=2) == 2383582846854711794
+    AL.random.seed(0)
+    for n in range(1, 10):
+        L = AL.random_lattice(n)
+        f = list(AL.random.permutation(n))
+        for version in [1, 2]:
+            expected = identity.hash_poset(L, version)
+            assert identity.hash_poset(L.reindex(f), version) == expected
+
+
+def test_hash_perm_invariant():
+    AL.random.seed(1)
+    for n in range(12):
+        P = AL.random_poset(n, 0.3)
+        mat = P.leq.astype(np.int64) * 12345 + AL.random.randint(0, 9, (n, n))
+        h = lambda l: identity.hasher(sorted(l))
+        expected = [identity.hasher((h(mat[:, i]), h(mat[i, :])))
+                    for i in range(n)]
+        assert list(identity.hash_perm_invariant(P, mat)) == expected
+        assert list(identity.hash_rows(mat)) == list(map(identity.hasher, mat))
+
+
+def test_canonical():
+    AL.random.seed(2)
+    for n in range(12):
+        P = AL.random_poset(n, AL.random.rand())
+        Q = P.reindex(list(AL.random.permutation(n)))
+        assert P.canonical.leq.tobytes() == Q.canonical.leq.tobytes()
+        assert not np.tril(P.canonical.leq, -1).any()
+        for g in P._canonization.generators:
+            assert (P.leq == P.leq[np.ix_(g, g)]).all()
+    # Non-isomorphic posets have different canonical forms
+    lattices = list(AL.iter_all_lattices(7))
+    canonical = {L.canonical.leq.tobytes() for L in lattices}
+    assert len(canonical) == len(lattices)
+    boolean = AL.Lattice.from_children([[], [0], [0], [0], [1, 2], [1, 3],
+                                        [2, 3], [4, 5, 6]])
+    assert len(boolean._canonization.generators) >= 2
+    assert boolean.automorphisms.order == 6
+    # Random lattices have many twin atoms, which must not blow up
+    L = AL.random_lattice(150)
+    Q = L.reindex(list(AL.random.permutation(150)))
+    start = time.time()
+    assert L == Q
+    assert L.canonical.leq.tobytes() == Q.canonical.leq.tobytes()
+    assert time.time() - start < 2
+
+
+def test_iter_isomorphisms():
+    AL.random.seed(3)
+    for n in range(7):
+        P = AL.random_poset(n, AL.random.rand())
+        Q = P.reindex(list(AL.random.permutation(n)))
+        expected = [list(f) for f in itertools.permutations(range(n))
+                    if (P.leq == Q.leq[np.ix_(f, f)]).all()]
+        assert sorted(identity.iter_isomorphisms(P, Q)) == expected
+    # Symmetric posets must not explode
+    antichain = AL.Poset.from_children([[] for _ in range(30)])
+    f = list(AL.random.permutation(30))
+    assert identity.find_isomorphism(antichain, antichain.reindex(f))
+
+
+def test_automorphisms():
+    AL.random.seed(4)
+    for n in range(10):
+        P = AL.random_poset(n, AL.random.rand() * 0.5)
+        auts = list(identity.iter_isomorphisms(P, P))
+        assert P.automorphisms.order == len(auts)
+        orbits = {tuple(sorted({f[x] for f in auts})) for x in range(n)}
+        assert P.automorphisms.orbits == sorted(map(list, orbits))
+    antichain = AL.Poset.from_children([[] for _ in range(10)])
+    assert antichain.automorphisms.order == 3628800
+
+
+def test_poset_index():
+    AL.random.seed(5)
+    posets = [AL.random_poset(n, 0.4) for n in range(6) for _ in range(30)]
+    index = AL.PosetIndex()
+    for P in posets:
+        Q = P.reindex(list(AL.random.permutation(P.n)))
+        index.add(P)
+        assert Q in index and not index.add(Q)
+    classes = {P.canonical.leq.tobytes() for P in posets}
+    assert len(index) == len(classes) == index.stats()['size']
+    assert {P.canonical.leq.tobytes() for P in index} == classes
+    lattices = AL.PosetIndex(AL.Lattice, AL.iter_all_lattices(7))
+    assert len(lattices) == 79 and all(isinstance(L, AL.Lattice) for L in lattices)
+
+
+def test_reindex():
+    AL.random.seed(6)
+    for n in range(1, 10):
+        L = AL.random_lattice(n)
+        _ = L.lub, L.dist, L.hash, L.canonical
+        f = list(AL.random.permutation(n))
+        Q = L.reindex(f, carry=True)
+        R = AL.Lattice(Q.leq, check=False)
+        for i in range(n):
+            for j in range(n):
+                assert L.leq[i, j] == Q.leq[f[i], f[j]]
+        assert (Q.lub == R.lub).all() and (Q.child == R.child).all()
+        assert (Q.dist == R.dist).all() and Q.hash == R.hash
+        assert (Q.hash_elems == R.hash_elems).all()
+        assert (L.reindex(f, inverse=True).reindex(f).leq == L.leq).all()
+        domain = [i for i in range(n) if i % 2 == 0]
+        sub = graph.subgraph(L, domain)
+        assert (sub.leq == L.leq[np.ix_(domain, domain)]).all()
+
+
+def test_hash_stack():
+    AL.random.seed(7)
+    for n in range(8):
+        posets = [AL.random_poset(n, 0.3) for _ in range(20)]
+        stack = np.array([P.leq for P in posets]).reshape(20, n, n)
+        hashes, elems = identity.hash_stack(stack, elems=True)
+        assert list(hashes) == [P.hash for P in posets]
+        assert (elems == [P.hash_elems for P in posets]).all()
+    # Large stacks use the vectorized xxh64
+    posets = [AL.random_poset(5, 0.3) for _ in range(300)]
+    hashes = identity.hash_stack(np.array([P.leq for P in posets]))
+    assert list(hashes) == [P.hash for P in posets]
+    rows = AL.random.randint(-2**62, 2**62, (2000, 9))
+    assert list(identity.hash_rows(rows)) == list(map(identity.hasher, rows))
+
+
+if __name__ == '__main__':
+    test_hash_versions()
+    test_hash_perm_invariant()
+    test_canonical()
+    test_iter_isomorphisms()
+    test_automorphisms()
+    test_poset_index()
+    test_reindex()
+    test_hash_stack()
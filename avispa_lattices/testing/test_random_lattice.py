@@ -0,0 +1,22 @@
+from .. import AL
+from ..random_lattice import czech_algorithm
+
+
+def test_czech_algorithm():
+    # Same output and same random numbers consumed as the original
+    for seed in range(50):
+        for n in [0, 1, 2, 3, 5, 8, 13, 40]:
+            AL.random.seed(seed)
+            expected = czech_algorithm.random_lattice_original(n)
+            after = AL.random.randint(0, 2**31)
+            AL.random.seed(seed)
+            found = czech_algorithm.random_lattice(n)
+            assert (found == expected).all(), (seed, n)
+            assert AL.random.randint(0, 2**31) == after
+    AL.random.seed(0)
+    for n in range(1, 30):
+        assert AL.random_lattice(n).is_lattice
+
+
+if __name__ == '__main__':
+    test_czech_algorithm()
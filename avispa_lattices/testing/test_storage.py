@@ -0,0 +1,46 @@
+from pathlib import Path
+import pickle
+import tempfile
+import numpy as np
+from .. import AL
+
+
+def test_lattice_file():
+    lattices = list(AL.iter_all_lattices(7))
+    AL.random.seed(0)
+    lattices += [AL.random_lattice(n) for n in range(1, 20)]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / 'lattices.bin'
+        with AL.LatticeWriter(path) as writer:
+            writer.extend(lattices)
+        with AL.LatticeFile(path) as found:
+            assert len(found) == len(lattices)
+            assert list(found.sizes) == [L.n for L in lattices]
+            for L, R in zip(lattices, found):
+                assert not np.tril(R.leq, -1).any()
+                assert L == R
+            assert (found[5].leq == lattices[5].leq).all()
+            assert found[-1] == lattices[-1]
+            assert len(list(found.of_size(7))) == 53 + 1
+
+
+def test_lattice_record():
+    lattices = list(AL.iter_all_lattices(7))
+    records = list(AL.iter_all_lattices(7, compact=True))
+    assert not hasattr(records[0], '__dict__')
+    assert [R.n for R in records] == [L.n for L in lattices]
+    for L, R in zip(lattices, records):
+        assert (R.leq == L.leq).all() and R.to_lattice() == L
+        assert R == AL.LatticeRecord.from_lattice(L)
+        assert pickle.loads(pickle.dumps(R)) == R
+    assert AL.LatticeRecord.from_lattice(L, hash=True).hash == L.hash
+    found = set(AL.iter_all_lattices_parallel(7, 2, compact=True))
+    assert found == set(records)
+    found = list(AL.iter_all_lattices_by_level(7, compact=True))
+    assert len(found) == 79 and set(found) == set(
+        AL.iter_all_lattices(7, method='augmentation', compact=True))
+
+
+if __name__ == '__main__':
+    test_lattice_file()
+    test_lattice_record()
@@ -14,6 +14,9 @@ random_lattice_methods: Tuple[str] = literal_args(random_lattice_method)
 f_iter_method = Literal['auto', 'lub', 'all', 'monotones', 'lub_no_bottom']
 f_iter_methods: Tuple[str] = literal_args(f_iter_method)
 
+iter_all_lattices_method = Literal['BFS', 'augmentation']
+iter_all_lattices_methods: Tuple[str] = literal_args(iter_all_lattices_method)
+
 random_f_method = Literal['auto', 'arbitrary', 'monotone', 'lub', 'monotone_A',
                           'monotone_B']
 random_f_methods: Tuple[str] = literal_args(random_f_method)
@@ -0,0 +1,91 @@
+from __future__ import annotations
+import json
+import os
+from pathlib import Path
+from typing import Any, Callable, Dict, Optional, Union
+
+import xxhash
+
+State = Dict[str, Any]
+
+
+class Cursor:
+    '''
+    Serializable position of a long running enumeration.
+
+    Enumerators that accept a cursor keep it pointing to the last item
+    they yielded. Saving the cursor after processing an item and passing
+    the loaded cursor to the same enumerator later on resumes the job
+    right after that item, with no duplicates or gaps.
+
+        cursor = Cursor.load(path) if path.exists() else Cursor()
+        for f in L.f_iter_monotones(cursor=cursor):
+            process(f)
+            if time_to_save():
+                cursor.save(path)
+
+    The state is a JSON dictionary, so it can be saved anywhere.
+    '''
+
+    state: Optional[State]
+
+    def __init__(self, state: Optional[State] = None):
+        self.state = state
+        self._snapshot: Optional[Callable[[], State]] = None
+
+    def attach(self, name: str, signature: str,
+               snapshot: Callable[[], State]) -> Optional[State]:
+        '''
+        Used by the enumerators. Registers how to compute the state and
+        returns the state from which the enumeration must resume, if any.
+        '''
+        previous = self.state
+        if previous is not None:
+            found = (previous.get('name'), previous.get('signature'))
+            assert found == (name, signature), (
+                f'The cursor belongs to a different enumeration: {found}')
+        self._snapshot = lambda: {
+            'name': name,
+            'signature': signature,
+            **snapshot(),
+        }
+        return previous
+
+    @staticmethod
+    def signature(*args) -> str:
+        'Digest of the arguments that define an enumeration'
+        h = xxhash.xxh64()
+        for arg in args:
+            if hasattr(arg, 'tobytes'):
+                h.update(arg.tobytes())
+            else:
+                h.update(repr(arg).encode())
+            h.update(b'|')
+        return h.hexdigest()
+
+    def snapshot(self) -> Optional[State]:
+        'Current state of the cursor'
+        if self._snapshot is not None:
+            self.state = self._snapshot()
+        return self.state
+
+    def dumps(self) -> str:
+        return json.dumps(self.snapshot())
+
+    @classmethod
+    def loads(cls, text: str):
+        return cls(json.loads(text))
+
+    def save(self, path: Union[str, Path]):
+        'Save atomically, so that an interruption never corrupts the file'
+        path = Path(path)
+        tmp = path.with_name(f'{path.name}.tmp')
+        tmp.write_text(self.dumps())
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Union[str, Path]):
+        return cls.loads(Path(path).read_text())
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.snapshot()})'
@@ -114,13 +114,21 @@ class cached_property(property, _Property[_T]):
     1. inherit from property, which disables setattr(instance, name, value)
         as it raises AttributeError: Can't set attribute
     2. use instance.__dict__[name] = value to fix
+    3. since property is a data descriptor, instance.__dict__ is not looked
+        up automatically, so __get__ looks it up before computing
     '''
 
     def __init__(self, method: Callable[..., _T]):
         self._method = method
 
     def __get__(self, instance, _) -> _T:
+        if instance is None:
+            return self  # type:ignore
         name = self._method.__name__
+        try:
+            return instance.__dict__[name]
+        except KeyError:
+            pass
         value = self._method(instance)
         instance.__dict__[name] = value
         return value
@@ -11,6 +11,19 @@ class AL_RandomState(np.random.RandomState):
         high = np.iinfo(np.int32).max
         return super().randint(low, high, size=size)
 
+    def randbelow(self, n: int) -> int:
+        'uniform integer in range(n), for arbitrarily large n'
+        assert n > 0, n
+        nbits = (n - 1).bit_length()
+        while True:
+            k = 0
+            for chunk in super().randint(0, 2**32, (nbits + 31) // 32,
+                                         dtype=np.uint64):
+                k = (k << 32) | int(chunk)
+            k >>= (-nbits) % 32
+            if k < n:
+                return k
+
     def set_seed(self, seed: Optional[int] = None):
         super().seed(seed)
 